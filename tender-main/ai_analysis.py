@@ -1,65 +1,601 @@
-from typing import List, Dict
+import asyncio
+import json
+import logging
+import numbers
+import random
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Dict, Tuple, Any, Iterator, Optional
 from tender_core.models import TenderObject, WorkItem, TimeConditions
 from registry import ProviderRegistry
+from openrouter_provider import completion_text
+from llm_cache import LLMCache
+import httpx
 
-_llm = ProviderRegistry.get_provider()
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def analyze_risks(tender_obj: TenderObject, works: List[WorkItem], time_conditions: TimeConditions, region: str) -> Dict:
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+_cache = LLMCache()
+
+ANALYSIS_MODEL = "openai/gpt-oss-120b"
+# Для небольших тендеров хватает модели поменьше — дешевле и быстрее
+LIGHT_ANALYSIS_MODEL = "openai/gpt-oss-20b"
+# Лёгкая модель — если работ строго меньше этого числа
+LIGHT_MODEL_WORKS_LIMIT = 20
+# temperature=0 — ответы детерминированы, поэтому их можно кэшировать
+ANALYSIS_TEMPERATURE = 0.0
+
+# Бюджет, начиная с которого тендер считаем высокорисковым (руб.)
+BUDGET_RISK_THRESHOLD = 1_000_000
+
+# Повторы запросов к LLM при временных ошибках (429, 5xx, таймауты)
+RETRY_ATTEMPTS = 5
+RETRY_INITIAL_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+RETRY_AFTER_LIMIT = 60.0
+
+# Сколько запросов к LLM держим «в полёте» одновременно (rate limit OpenRouter)
+DEFAULT_CONCURRENCY = 8
+
+
+def _get_llm():
     """
-    Анализ рисков для тендера, включая возможные угрозы и рекомендации.
+    Провайдер LLM берём лениво, в момент вызова, а не при импорте модуля:
+    импорт не падает без OPENROUTER_API_KEY, а асинхронный клиент провайдера
+    создаётся уже внутри нужного event loop.
+    """
+    return ProviderRegistry.get_provider()
+
+
+def _run(coro):
+    """asyncio.run(...) для sync-обёрток с закрытием async-клиента провайдера."""
+    async def _main():
+        try:
+            return await coro
+        finally:
+            try:
+                await _get_llm().aclose()
+            except Exception:
+                pass
+
+    return asyncio.run(_main())
+
+
+def _retry_delay(exc: Exception, attempt: int) -> Optional[float]:
+    """
+    Пауза перед повтором запроса или None, если ошибка не временная.
+    Для 429 учитываем заголовок Retry-After, иначе — экспонента с джиттером.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        if status == 429:
+            retry_after = exc.response.headers.get("Retry-After")
+            try:
+                return min(float(retry_after), RETRY_AFTER_LIMIT)
+            except (TypeError, ValueError):
+                pass
+        elif status < 500:
+            return None
+    elif not isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, TimeoutError)):
+        return None
+
+    delay = min(RETRY_INITIAL_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+    return delay + random.uniform(0, delay / 2)
+
+
+async def _agenerate_with_retry(**kwargs: Any) -> Dict[str, Any]:
+    """provider.agenerate(...) с повторами при временных ошибках OpenRouter."""
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            return await _get_llm().agenerate(**kwargs)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None or attempt == RETRY_ATTEMPTS:
+                raise
+            logger.warning(
+                "Временная ошибка LLM (попытка %d/%d): %s. Повтор через %.1f с.",
+                attempt,
+                RETRY_ATTEMPTS,
+                e,
+                delay,
+            )
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+def _choose_model(works: List[WorkItem]) -> str:
+    """
+    Модель под сложность тендера: короткий перечень работ — лёгкая модель,
+    большой — полноразмерная.
+    """
+    if len(works) < LIGHT_MODEL_WORKS_LIMIT:
+        return LIGHT_ANALYSIS_MODEL
+    return ANALYSIS_MODEL
+
+
+def _cache_lookup(messages: List[Dict[str, Any]], model: str) -> Optional[Dict[str, Any]]:
+    """Поиск ответа в кэше по точному совпадению (model, messages, temperature)."""
+    return _cache.get(model, messages, ANALYSIS_TEMPERATURE)
+
+
+def _cache_store(messages: List[Dict[str, Any]], model: str, resp: Dict[str, Any]) -> Dict[str, Any]:
+    return _cache.set(model, messages, ANALYSIS_TEMPERATURE, resp)
+
+
+async def _agenerate_cached(messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> Dict[str, Any]:
+    """
+    Запрос к LLM через кэш: повторные промпты в рамках сессии не уходят в сеть.
+    """
+    resp = _cache_lookup(messages, model)
+    if resp is not None:
+        return resp
+    resp = await _agenerate_with_retry(messages=messages, model=model, temperature=ANALYSIS_TEMPERATURE, **kwargs)
+    return _cache_store(messages, model, resp)
+
+
+def _stream_lines(messages: List[Dict[str, Any]], model: str) -> Iterator[str]:
+    """
+    Потоковый запрос к LLM: отдаём строки ответа по мере прихода '\n',
+    не дожидаясь конца генерации. Итоговый ответ кладём в кэш.
+    """
+    resp = _cache_lookup(messages, model)
+    if resp is not None:
+        yield from completion_text(resp).splitlines()
+        return
+
+    parts: List[str] = []
+    buf = ""
+    for chunk in _get_llm().stream(messages=messages, model=model, temperature=ANALYSIS_TEMPERATURE):
+        if not chunk:
+            continue
+        parts.append(chunk)
+        buf += chunk
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            yield line.rstrip("\r")
+    if buf:
+        yield buf
+
+    content = "".join(parts)
+    if content:
+        _cache_store(messages, model, {"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+
+# Статичные системные промпты. Держим их байт-в-байт одинаковыми и первыми в
+# messages, а всё, что зависит от тендера, — в конце user-сообщения: так
+# провайдер (OpenAI / Anthropic через OpenRouter) кэширует общий префикс.
+RISK_SYSTEM_PROMPT = (
+    "Ты — эксперт по анализу рисков на тендерах (44-ФЗ, 223-ФЗ).\n"
+    "По описанию тендера, региону и перечню работ оцени риски участия и исполнения контракта.\n\n"
+    "Рассматривай как минимум следующие группы рисков:\n"
+    " • технические — сложность работ, нестандартные материалы, требования к оборудованию;\n"
+    " • сроковые — сжатые сроки, сезонность работ, зависимость этапов друг от друга;\n"
+    " • финансовые — недооценённая НМЦК, рост цен на материалы, авансирование, обеспечение;\n"
+    " • договорные — штрафы и пени, односторонний отказ, жёсткая приёмка, гарантии;\n"
+    " • региональные — логистика, климат, доступность подрядчиков и техники в регионе.\n\n"
+    "Формат ответа:\n"
+    "1) Каждый риск — отдельной строкой, без нумерации и маркдауна.\n"
+    "2) В строке: группа риска, краткое описание и оценка (низкий/средний/высокий).\n"
+    "3) Не выдумывай факты, которых нет во входных данных; если данных мало — так и напиши.\n"
+    "4) Пиши по-русски, кратко и по делу."
+)
+
+SCHEDULE_SYSTEM_PROMPT = (
+    "Ты — эксперт по анализу сроков на тендерах (44-ФЗ, 223-ФЗ).\n"
+    "По перечню работ оцени реалистичность сроков выполнения контракта.\n\n"
+    "Учитывай:\n"
+    " • последовательность работ и их зависимости (критический путь);\n"
+    " • типичную длительность каждого вида работ при нормальной загрузке бригады;\n"
+    " • сроки поставки материалов и оборудования;\n"
+    " • сезонные ограничения (земляные, фасадные, кровельные работы зимой);\n"
+    " • время на приёмку, исполнительную документацию и устранение замечаний.\n\n"
+    "Формат ответа:\n"
+    "1) Каждый пункт — отдельной строкой, без нумерации и маркдауна.\n"
+    "2) Указывай работу, ориентировочную длительность и возможные причины задержек.\n"
+    "3) Не выдумывай даты, которых нет во входных данных.\n"
+    "4) Пиши по-русски, кратко и по делу."
+)
+
+TENDER_SYSTEM_PROMPT = (
+    "Ты — эксперт по анализу рисков и сроков на тендерах (44-ФЗ, 223-ФЗ).\n"
+    "По описанию тендера, региону, перечню работ и временным условиям за один ответ "
+    "оцени риски участия и реалистичность сроков.\n\n"
+    "Риски рассматривай по группам: технические, сроковые, финансовые, договорные, региональные.\n"
+    "Сроки оценивай с учётом последовательности работ, поставок, сезонности и приёмки.\n\n"
+    "Верни СТРОГО ОДИН JSON-объект без пояснений и без ```, по схеме:\n"
+    '{"risks": ["..."], "schedule": ["..."], "recommendations": ["..."]}\n'
+    "где каждый элемент списка — одна короткая строка на русском языке. "
+    "Не выдумывай факты, которых нет во входных данных."
+)
+
+
+def _system_message(prompt: str, model: str) -> Dict[str, Any]:
+    """
+    Системное сообщение со статичным промптом.
+    Для Anthropic через OpenRouter ставим явную точку кэширования (cache_control),
+    OpenAI-модели кэшируют одинаковый префикс автоматически.
+    """
+    if model.startswith("anthropic/"):
+        return {
+            "role": "system",
+            "content": [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}],
+        }
+    return {"role": "system", "content": prompt}
+
+
+def _work_names_csv(works: List[WorkItem]) -> str:
+    """
+    Названия работ через запятую — собираем один раз на запрос.
+    Список, а не генератор: str.join всё равно материализует генератор в список.
+    """
+    return ", ".join([w.name for w in works])
+
+
+# Шаблоны пользовательских сообщений: строка-шаблон собирается один раз
+# при импорте, на вызове остаётся только подстановка через bound str.format
+_RISK_TEMPLATE = (
+    "Оцените риски для тендера.\n"
+    "Тендер: {title}\n"
+    "Регион: {region}\n"
+    "Работы: {works}"
+).format
+_SCHEDULE_TEMPLATE = (
+    "Проанализируйте временные условия для тендера с учётом текущих сроков и ограничений.\n"
+    "Работы: {works}"
+).format
+_TENDER_TEMPLATE = (
+    "Оцените риски и сроки для тендера.\n"
+    "Временные условия: {time_conditions}\n"
+    "Тендер: {title}\n"
+    "Регион: {region}\n"
+    "Работы: {works}"
+).format
+
+
+def _risk_messages(tender_obj: TenderObject, works_csv: str, region: str, model: str) -> List[Dict[str, Any]]:
+    text = _RISK_TEMPLATE(title=tender_obj.title, region=region, works=works_csv)
+    return [
+        _system_message(RISK_SYSTEM_PROMPT, model),
+        {"role": "user", "content": text}
+    ]
+
+
+def _schedule_messages(works_csv: str, model: str) -> List[Dict[str, Any]]:
+    text = _SCHEDULE_TEMPLATE(works=works_csv)
+    return [
+        _system_message(SCHEDULE_SYSTEM_PROMPT, model),
+        {"role": "user", "content": text}
+    ]
+
+
+def _tender_messages(
+    tender_obj: TenderObject,
+    works_csv: str,
+    time_conditions: TimeConditions,
+    region: str,
+    model: str,
+) -> List[Dict[str, Any]]:
+    text = _TENDER_TEMPLATE(
+        time_conditions=time_conditions, title=tender_obj.title, region=region, works=works_csv
+    )
+    return [
+        _system_message(TENDER_SYSTEM_PROMPT, model),
+        {"role": "user", "content": text}
+    ]
+
+
+def _empty_fused() -> Dict:
+    return {"risks": [], "schedule": [], "recommendations": []}
+
+
+def _failed_fused() -> Dict:
+    return {
+        "risks": ["Не удалось провести анализ рисков."],
+        "schedule": ["Не удалось провести анализ сроков."],
+        "recommendations": [],
+    }
+
+
+def _fused_list(data: Dict[str, Any], field: str) -> List[Any]:
+    value = data.get(field) or []
+    # Одиночную строку модель иногда отдаёт без списка — list() разбил бы её на символы
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        raise ValueError(f"Поле {field!r} в ответе LLM должно быть списком, а не {type(value).__name__}")
+    return value
+
+
+def _parse_fused(resp: Dict[str, Any]) -> Dict:
+    data = json.loads(completion_text(resp))
+    if not isinstance(data, dict):
+        raise ValueError(f"Ответ LLM должен быть JSON-объектом, а не {type(data).__name__}")
+    return {
+        "risks": _fused_list(data, "risks"),
+        "schedule": _fused_list(data, "schedule"),
+        "recommendations": _fused_list(data, "recommendations"),
+    }
+
+
+async def _agenerate_fused(messages: List[Dict[str, Any]], model: str) -> Dict:
+    """
+    Совместный запрос рисков и сроков через кэш. Ответ сначала разбираем и
+    только потом кладём в кэш: битый JSON не должен воспроизводиться из кэша.
+    """
+    resp = _cache_lookup(messages, model)
+    if resp is not None:
+        return _parse_fused(resp)
+    resp = await _agenerate_with_retry(
+        messages=messages, model=model, temperature=ANALYSIS_TEMPERATURE, response_format={"type": "json_object"}
+    )
+    parsed = _parse_fused(resp)
+    _cache_store(messages, model, resp)
+    return parsed
+
+
+async def analyze_tender_all_async(
+    tender_obj: TenderObject,
+    works: List[WorkItem],
+    time_conditions: TimeConditions,
+    region: str,
+) -> Dict:
+    """
+    Риски и сроки тендера одним запросом к LLM (вместо двух отдельных).
+    Возвращает {"risks": [...], "schedule": [...], "recommendations": [...]}.
     """
     if not tender_obj or not works:
-        return {"risks": [], "recommendations": []}
+        return _empty_fused()
 
-    # Примерный запрос на анализ рисков
-    text = f"Оцените риски для тендера {tender_obj.title} в регионе {region}. Примените анализ рисков по следующим работам: {', '.join([w.name for w in works])}"
+    try:
+        model = _choose_model(works)
+        messages = _tender_messages(tender_obj, _work_names_csv(works), time_conditions, region, model)
+        return await _agenerate_fused(messages, model)
+    except Exception as e:
+        logger.exception("Ошибка при анализе тендера: %s", e)
+        return _failed_fused()
+
+
+def analyze_tender_all(
+    tender_obj: TenderObject,
+    works: List[WorkItem],
+    time_conditions: TimeConditions,
+    region: str,
+) -> Dict:
+    """
+    Совместный анализ рисков и сроков тендера одним запросом к LLM.
+    """
+    return _run(analyze_tender_all_async(tender_obj, works, time_conditions, region))
+
+
+async def analyze_risks_async(tender_obj: TenderObject, works: List[WorkItem], time_conditions: TimeConditions, region: str) -> Dict:
+    """
+    Асинхронный анализ рисков для тендера (см. analyze_risks).
+    """
+    if not tender_obj or not works:
+        return {"risks": [], "recommendations": []}
 
     try:
-        messages = [
-            {"role": "system", "content": "Ты — эксперт по анализу рисков на тендерах."},
-            {"role": "user", "content": text}
-        ]
-        resp = _llm.generate(messages=messages, model="openai/gpt-oss-120b", temperature=0.3)
-        return {"risks": resp["choices"][0]["message"]["content"].splitlines(), "recommendations": []}
+        model = _choose_model(works)
+        messages = _risk_messages(tender_obj, _work_names_csv(works), region, model)
+        resp = await _agenerate_cached(messages, model)
+        return {"risks": completion_text(resp).splitlines(), "recommendations": []}
     except Exception as e:
-        print(f"Ошибка при анализе рисков: {e}")
+        logger.exception("Ошибка при анализе рисков: %s", e)
         return {"risks": ["Не удалось провести анализ рисков."], "recommendations": []}
 
 
-def analyze_schedule(works: List[WorkItem], time_conditions: TimeConditions) -> Dict:
+async def analyze_schedule_async(works: List[WorkItem], time_conditions: TimeConditions) -> Dict:
     """
-    Анализ сроков выполнения работ, включая задержки, сроки, и рекомендации.
+    Асинхронный анализ сроков выполнения работ (см. analyze_schedule).
     """
     if not works or not time_conditions:
         return {"schedule": [], "recommendations": []}
 
-    text = f"Проанализируйте временные условия для тендера с работами: {', '.join([w.name for w in works])}. Учитывайте текущие сроки и временные ограничения."
-
     try:
-        messages = [
-            {"role": "system", "content": "Ты — эксперт по анализу сроков на тендерах."},
-            {"role": "user", "content": text}
-        ]
-        resp = _llm.generate(messages=messages, model="openai/gpt-oss-120b", temperature=0.3)
-        return {"schedule": resp["choices"][0]["message"]["content"].splitlines(), "recommendations": []}
+        model = _choose_model(works)
+        messages = _schedule_messages(_work_names_csv(works), model)
+        resp = await _agenerate_cached(messages, model)
+        return {"schedule": completion_text(resp).splitlines(), "recommendations": []}
     except Exception as e:
-        print(f"Ошибка при анализе сроков: {e}")
+        logger.exception("Ошибка при анализе сроков: %s", e)
         return {"schedule": ["Не удалось провести анализ сроков."], "recommendations": []}
 
 
+def analyze_risks_stream(tender_obj: TenderObject, works: List[WorkItem], time_conditions: TimeConditions, region: str) -> Iterator[str]:
+    """
+    Потоковый анализ рисков: генератор строк ответа LLM по мере генерации.
+    """
+    if not tender_obj or not works:
+        return
+
+    try:
+        model = _choose_model(works)
+        yield from _stream_lines(_risk_messages(tender_obj, _work_names_csv(works), region, model), model)
+    except Exception as e:
+        logger.exception("Ошибка при анализе рисков: %s", e)
+        yield "Не удалось провести анализ рисков."
+
+
+def analyze_schedule_stream(works: List[WorkItem], time_conditions: TimeConditions) -> Iterator[str]:
+    """
+    Потоковый анализ сроков: генератор строк ответа LLM по мере генерации.
+    """
+    if not works or not time_conditions:
+        return
+
+    try:
+        model = _choose_model(works)
+        yield from _stream_lines(_schedule_messages(_work_names_csv(works), model), model)
+    except Exception as e:
+        logger.exception("Ошибка при анализе сроков: %s", e)
+        yield "Не удалось провести анализ сроков."
+
+
+def analyze_risks(tender_obj: TenderObject, works: List[WorkItem], time_conditions: TimeConditions, region: str) -> Dict:
+    """
+    Анализ рисков для тендера, включая возможные угрозы и рекомендации.
+    """
+    return _run(analyze_risks_async(tender_obj, works, time_conditions, region))
+
+
+def analyze_schedule(works: List[WorkItem], time_conditions: TimeConditions) -> Dict:
+    """
+    Анализ сроков выполнения работ, включая задержки, сроки, и рекомендации.
+    """
+    return _run(analyze_schedule_async(works, time_conditions))
+
+
+async def _batch_async(
+    tenders: List[Tuple[TenderObject, List[WorkItem], TimeConditions, str]],
+    concurrency: int,
+) -> List[Dict]:
+    # 1) Готовим все промпты заранее. custom_id — сам запрос (модель + messages),
+    #    поэтому одинаковые тендеры в пакете уходят в LLM один раз.
+    batch: Dict[str, Tuple[List[Dict[str, Any]], str]] = {}
+    custom_ids: List[Optional[str]] = []
+    for tender_obj, works, time_conditions, region in tenders:
+        if not tender_obj or not works:
+            custom_ids.append(None)
+            continue
+        model = _choose_model(works)
+        messages = _tender_messages(tender_obj, _work_names_csv(works), time_conditions, region, model)
+        custom_id = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        batch.setdefault(custom_id, (messages, model))
+        custom_ids.append(custom_id)
+
+    # 2) Отправляем уникальные запросы параллельно (не более concurrency одновременно)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _send(messages: List[Dict[str, Any]], model: str) -> Dict:
+        async with semaphore:
+            return await _agenerate_fused(messages, model)
+
+    ids = list(batch)
+    results = await asyncio.gather(*(_send(*batch[i]) for i in ids), return_exceptions=True)
+
+    by_id: Dict[str, Dict] = {}
+    for custom_id, res in zip(ids, results):
+        if isinstance(res, BaseException):
+            logger.error("Ошибка при пакетном анализе тендера: %s", res)
+            res = _failed_fused()
+        by_id[custom_id] = res
+
+    # 3) Раскладываем ответы обратно по тендерам в исходном порядке
+    return [dict(by_id[i]) if i is not None else _empty_fused() for i in custom_ids]
+
+
+def batch_analyze(
+    tenders: List[Tuple[TenderObject, List[WorkItem], TimeConditions, str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Dict]:
+    """
+    Пакетный совместный анализ рисков и сроков для списка тендеров.
+
+    Каждый элемент tenders — кортеж (tender_obj, works, time_conditions, region).
+    Промпты строятся заранее, одинаковые запросы схлопываются, уникальные
+    уходят в LLM параллельно. Результат — список
+    {"risks": [...], "schedule": [...], "recommendations": [...]}
+    в порядке входных тендеров.
+    """
+    if not tenders:
+        return []
+    return _run(_batch_async(tenders, concurrency))
+
+
+def batch_analyze_risks(
+    tenders: List[Tuple[TenderObject, List[WorkItem], TimeConditions, str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Dict]:
+    """Риски по пакету тендеров (тот же пакетный запрос, что и batch_analyze)."""
+    return [
+        {"risks": r["risks"], "recommendations": r["recommendations"]}
+        for r in batch_analyze(tenders, concurrency)
+    ]
+
+
+def batch_analyze_schedule(
+    tenders: List[Tuple[TenderObject, List[WorkItem], TimeConditions, str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Dict]:
+    """
+    Сроки по пакету тендеров. Повторный вызов после batch_analyze_risks
+    с теми же тендерами обслуживается из кэша без запросов к LLM.
+    """
+    return [
+        {"schedule": r["schedule"], "recommendations": []}
+        for r in batch_analyze(tenders, concurrency)
+    ]
+
+
+def run_all(
+    tenders: List[Tuple[TenderObject, List[WorkItem], TimeConditions, str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """
+    Пакетный анализ рисков и сроков для списка тендеров.
+
+    Каждый элемент tenders — кортеж (tender_obj, works, time_conditions, region).
+    Работает поверх batch_analyze, результат — список
+    {"risks": ..., "schedule": ...} в порядке входных тендеров.
+    """
+    return [
+        {
+            "risks": {"risks": r["risks"], "recommendations": r["recommendations"]},
+            "schedule": {"schedule": r["schedule"], "recommendations": []},
+        }
+        for r in batch_analyze(tenders, concurrency)
+    ]
+
+
+_WORK_FIELDS = attrgetter("name", "volume", "unit")
+
+
+@lru_cache(maxsize=512)
+def _build_wbs_cached(works_key: Tuple[Tuple[str, float, str], ...]) -> Dict:
+    # Простой пример — строим иерархию работ
+    wbs = {
+        name: {"tasks": [{"name": name, "volume": volume, "unit": unit}]}
+        for name, volume, unit in works_key
+    }
+    return {"wbs": wbs}
+
+
 def build_wbs(works: List[WorkItem]) -> Dict:
     """
     Строит иерархию работ (Work Breakdown Structure).
+
+    Результат кэшируется по (name, volume, unit) работ и общий для одинаковых
+    наборов — изменять его на месте нельзя.
     """
     if not works:
         return {"wbs": []}
 
-    # Простой пример — строим иерархию работ
-    wbs = {}
-    for work in works:
-        wbs[work.name] = {"tasks": [{"name": work.name, "volume": work.volume, "unit": work.unit}]}
+    return _build_wbs_cached(tuple(map(_WORK_FIELDS, works)))
 
-    return {"wbs": wbs}
+
+if np is not None and njit is not None:
+    # Компилируется при первом вызове (и кэшируется на диске), а не при импорте.
+    # Без fastmath: он разрешает компилятору считать, что NaN не бывает,
+    # а NaN здесь — признак «нет цены».
+    @njit(cache=True)
+    def _budget_kernel(volumes, prices):
+        """Поэлементное volumes * prices; NaN в prices (нет цены) даёт NaN."""
+        n = volumes.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        for i in range(n):
+            out[i] = volumes[i] * prices[i]
+        return out
+else:
+    _budget_kernel = None
 
 
 def analyze_budget(works: List[WorkItem], prices: Dict) -> Dict:
@@ -69,13 +605,42 @@ def analyze_budget(works: List[WorkItem], prices: Dict) -> Dict:
     if not works or not prices:
         return {"budget": [], "recommendations": []}
 
-    budget_analysis = []
-    for work in works:
-        price = prices.get(work.name)
-        if price:
-            budget_analysis.append({"work_name": work.name, "budget": work.volume * price})
+    names = [w.name for w in works]
+    # Ни одна работа не покрыта ценами (частый случай для разреженного прайса):
+    # проверка на C-уровне, без арифметики и без прохода по ценам
+    if prices.keys().isdisjoint(names):
+        return {"budget": [{"work_name": n, "budget": "Нет данных"} for n in names], "recommendations": []}
+
+    # Цены, выровненные по порядку works: один проход по словарю вместо
+    # поиска внутри арифметического цикла. Нет цены (или 0) -> None.
+    price_vec = [prices.get(n) or None for n in names]
+
+    if np is not None:
+        # Векторно: одно умножение по всем работам; нет цены -> NaN
+        volumes = np.fromiter((w.volume for w in works), dtype=np.float64, count=len(works))
+        prices_arr = np.array(price_vec, dtype=np.float64)
+        if _budget_kernel is not None:
+            budgets = _budget_kernel(volumes, prices_arr)
         else:
-            budget_analysis.append({"work_name": work.name, "budget": "Нет данных"})
+            budgets = volumes * prices_arr
+        missing = np.isnan(budgets)
+        # Целые объём и цена давали целый бюджет (1500, а не 1500.0) — для таких
+        # пар считаем точное произведение, как раньше, а не берём float из массива
+        budget_analysis = [
+            {
+                "work_name": n,
+                "budget": "Нет данных" if miss
+                else w.volume * p if type(w.volume) is int and type(p) is int
+                else b,
+            }
+            for n, w, p, b, miss in zip(names, works, price_vec, budgets.tolist(), missing.tolist())
+        ]
+        return {"budget": budget_analysis, "recommendations": []}
+
+    budget_analysis = [
+        {"work_name": n, "budget": w.volume * p if p is not None else "Нет данных"}
+        for n, w, p in zip(names, works, price_vec)
+    ]
 
     return {"budget": budget_analysis, "recommendations": []}
 
@@ -88,8 +653,16 @@ def analyze_strategy(tender_obj: TenderObject, budget: Dict, risks: Dict) -> Dic
         return {"strategy": [], "recommendations": []}
 
     strategy = []
-    total_budget = sum([b["budget"] for b in budget["budget"] if isinstance(b["budget"], (int, float))])
-    if total_budget < 1000000:
+    # Считаем сумму только до порога: как только он превышен, исход уже известен
+    total_budget = 0.0
+    for b in budget["budget"]:
+        v = b["budget"]
+        # numpy.float64/int64 тоже числа (numbers.Real), а bool — нет
+        if isinstance(v, numbers.Real) and not isinstance(v, bool):
+            total_budget += v
+            if total_budget >= BUDGET_RISK_THRESHOLD:
+                break
+    if total_budget < BUDGET_RISK_THRESHOLD:
         strategy.append("Рекомендуется участвовать в тендере, так как бюджет ниже средней рыночной стоимости.")
     else:
         strategy.append("Тендер может быть высокорисковым, требуется дополнительная проверка.")
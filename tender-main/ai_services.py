@@ -2,12 +2,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
 import json
 import logging
+import mmap
 import re
-import copy
-from typing import Any, Dict, List, Optional
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ---------------------------
 # Загрузка .env (если есть)
@@ -24,6 +36,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ai_services")
 from search_services import SearchService
+from llm_cache import LLMCache
 
 # Попытка подключить MindSearch-провайдера LLM
 try:
@@ -43,6 +56,22 @@ logger = logging.getLogger("ai_services")
 
 MODEL_NAME = os.getenv("MODEL_NAME", "openai/gpt-oss-120b")
 _llm_provider = None
+_search_service: Optional[SearchService] = None
+_search_service_lock = threading.Lock()
+# Сколько запросов к SearchService (цены, исполнители) отправляем одновременно
+SEARCH_WORKERS = 8
+# Сколько запросов с чанками текста отправляем в LLM одновременно
+LLM_CHUNK_CONCURRENCY = 4
+# Сколько чанков кладём в один запрос и лимит ответа на один чанк
+LLM_CHUNK_BATCH_SIZE = 2
+LLM_CHUNK_MAX_TOKENS = 1024
+# Извлечение полей — детерминированное (и поэтому кэшируемое), чат — как раньше
+EXTRACTION_TEMPERATURE = 0.0
+CHAT_TEMPERATURE = 0.7
+
+# Кэш ответов LLM по точному совпадению (model + messages + temperature) —
+# только для детерминированного извлечения; ответы чата (temperature>0) не кэшируем
+_llm_cache = LLMCache()
 
 # --------------------
 # Базовая схема JSON
@@ -125,6 +154,67 @@ UNIFIED_TENDER_SCHEMA: Dict[str, Any] = {
 }
 
 
+# ---------------------------
+# Регулярные выражения (компилируются один раз при импорте)
+# ---------------------------
+_JSON_DECODER = json.JSONDecoder()
+
+_RE_CODE_FENCE = re.compile(r"^```[a-zA-Z0-9]*")
+_RE_FENCE_OPEN = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_RE_FENCE_CLOSE = re.compile(r"\s*```$")
+_RE_TRAIL_COMMA_OBJ = re.compile(r",\s*(\})")
+_RE_TRAIL_COMMA_ARR = re.compile(r",\s*(\])")
+_QUOTE_TABLE = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"})
+
+_RE_SPACES = re.compile(r"\s+")
+_RE_SENTENCE_END = re.compile(r"[.!?]+\s")
+_RE_INN = re.compile(r"\b\d{10,12}\b")
+_RE_KPP = re.compile(r"\b\d{9}\b")
+_RE_OGRN = re.compile(r"\b\d{13}\b")
+_RE_QTY = re.compile(r"\b\d{1,6}\b")
+# Позиция «наименование — количество — единица» (работа или товар)
+_RE_ITEM = re.compile(
+    r"(.+?)\s+([\d\s\.,]*\d[\d\s\.,]*)\s*(шт|штук|м2|м3|м³|м|тонн|т|кг|литр|л|ед|упак|компл|пог\.м|п\.м\.)",
+    re.IGNORECASE,
+)
+# Дешёвый префильтр для _RE_ITEM: количество обязано содержать цифру, поэтому
+# строка без цифр не совпадёт, а на длинных строках без совпадения ленивый
+# (.+?) перебирает квадратично
+_RE_HAS_DIGIT = re.compile(r"\d")
+_RE_LEAD_NUM = re.compile(r"^[\d\.\)\s]+")
+_RE_TITLE_NA = re.compile(r"на\s+(.+)", re.IGNORECASE)
+_RE_PHONE = re.compile(r"\+7\d{10}|\b8\d{10}\b")
+
+# Признаки строки-заголовка в начале ТЗ
+_TITLE_KEYWORDS = (
+    "поставка",
+    "оказание услуг",
+    "оказание услуги",
+    "выполнение работ",
+    "строитель",
+    "ремонт",
+)
+
+# Ключевые слова полей заказчика/объекта/количества в _fallback_parse —
+# общий префильтр для строки (проверки внутри цикла остаются прежними)
+_RE_FIELD_KEYWORDS = re.compile(
+    "|".join(
+        re.escape(kw)
+        for kw in (
+            "заказчик", "инн", "кпп", "огрн", "тел", "email", "почт",
+            "объект", "место постав", "адрес", "количество",
+        )
+    )
+)
+
+# Позиции с этими единицами или словами в названии — работы, остальные — товары
+_WORK_ONLY_UNITS = frozenset({"пог.м", "п.м."})
+_WORK_KEYWORDS = ("работ", "услуг", "монтаж", "укладк", "устройств", "ремонт")
+
+# Признаки того, что строка похожа на контактные данные
+_CONTACT_TOKENS = ("тел", "phone", "факс", "e-mail", "email", "@")
+
+
 # ---------------------------
 # Провайдер LLM
 # ---------------------------
@@ -151,22 +241,68 @@ def get_llm_provider(enable: bool = True) -> Optional[Any]:
     return _llm_provider
 
 
+def get_search_service() -> SearchService:
+    """
+    Общий SearchService на процесс: его кэш цен переживает отдельные тендеры,
+    поэтому одинаковые позиции не ищутся повторно.
+    """
+    global _search_service
+    if _search_service is None:
+        # зовётся из потоков пула — создаём сервис (и его кэш) ровно один раз
+        with _search_service_lock:
+            if _search_service is None:
+                _search_service = SearchService()
+    return _search_service
+
+
 # ---------------------------
 # Вспомогательные функции JSON
 # ---------------------------
+def _loads(data: str | bytes) -> Any:
+    """Разбор JSON: orjson, если установлен, иначе stdlib json."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """
+    JSON в UTF-8 с отступом 2 и кириллицей как есть (как json.dumps(..., ensure_ascii=False, indent=2)).
+    orjson, если установлен (нестроковые ключи приводятся к строкам, как в json);
+    типы, которые orjson не умеет, отдаём stdlib json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _dumps(obj: Any) -> str:
+    """То же, что _dumps_bytes, но строкой."""
+    return _dumps_bytes(obj).decode("utf-8")
+
+
 def _strip_code_fences(s: str) -> str:
     if not s:
         return ""
     s = s.strip()
     if s.startswith("```"):
-        s = re.sub(r"^```[a-zA-Z0-9]*", "", s).strip()
+        s = _RE_CODE_FENCE.sub("", s).strip()
     if s.endswith("```"):
         s = s[:-3].strip()
     return s
 
 
-import json
-import re
+def _cleanup_json_string(s: str) -> str:
+    # «умные» кавычки -> обычные, одним проходом
+    s = s.translate(_QUOTE_TABLE)
+    # убираем запятые перед закрывающими скобками: , } или , ]
+    s = _RE_TRAIL_COMMA_OBJ.sub(r"\1", s)
+    s = _RE_TRAIL_COMMA_ARR.sub(r"\1", s)
+    return s
+
 
 def parse_json_from_text(text: str):
     if not text:
@@ -175,48 +311,28 @@ def parse_json_from_text(text: str):
     t = text.strip()
 
     # 1) убрать ```json ... ``` или любые ``` ... ```
-    t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
-    t = re.sub(r"\s*```$", "", t)
+    t = _RE_FENCE_OPEN.sub("", t)
+    t = _RE_FENCE_CLOSE.sub("", t)
 
-    # 2) попытка: найти первый JSON-объект по балансу фигурных скобок
+    # 2) попытка: разобрать первый JSON-объект с первой "{" (C-декодер,
+    #    хвост после объекта игнорируется)
     start = t.find("{")
     if start != -1:
-        depth = 0
-        for i in range(start, len(t)):
-            ch = t[i]
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    candidate = t[start:i+1].strip()
-                    try:
-                        return json.loads(candidate)
-                    except Exception:
-                        break  # упало, попробуем regex ниже
-
-    # 3) запасной вариант: regex “самый внешний объект”
-    m = re.search(r"\{.*\}", t, flags=re.DOTALL)
-    if m:
-        candidate = m.group(0)
         try:
-            return json.loads(candidate)
-        except Exception:
-            return None
-
-    return None
-
-
-    def _cleanup_json_string(s: str) -> str:
-        s = s.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
-        # убираем запятые перед закрывающими скобками: , } или , ]
-        s = re.sub(r",\s*(\})", r"\1", s)
-        s = re.sub(r",\s*(\])", r"\1", s)
-        return s
+            obj, _ = _JSON_DECODER.raw_decode(t, start)
+            return obj
+        except ValueError:
+            pass  # упало, попробуем regex ниже
+
+    # 3) запасной вариант: «самый внешний объект» — от первой "{" до последней "}"
+    end = t.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    candidate = t[start:end + 1]
 
     # Первая попытка — как есть
     try:
-        return json.loads(candidate)
+        return _loads(candidate)
     except Exception:
         pass
 
@@ -224,43 +340,79 @@ def parse_json_from_text(text: str):
     candidate2 = _cleanup_json_string(candidate)
     candidate2 = candidate2.replace("'", '"')
     try:
-        return json.loads(candidate2)
+        return _loads(candidate2)
     except Exception:
         logger.warning("parse_json_from_text: не смог распарсить JSON")
         return None
 
 
+# Схема — чистый JSON (dict/list/str/bool), поэтому свежая копия через
+# json.loads заметно дешевле copy.deepcopy (нет memo и диспетчеризации по типам)
+_SCHEMA_JSON = json.dumps(UNIFIED_TENDER_SCHEMA, ensure_ascii=False)
+
+
+def _copy_template(t: Any) -> Any:
+    """Копия шаблона; ключи словарей — те же (интернированные) строки, что в шаблоне."""
+    if isinstance(t, dict):
+        return {k: _copy_template(v) for k, v in t.items()}
+    if isinstance(t, list):
+        return [_copy_template(v) for v in t]
+    return t
+
+
 def _deep_copy_schema() -> Dict[str, Any]:
-    """Безопасный deepcopy схемы, чтобы не ломать шаблон."""
-    return copy.deepcopy(UNIFIED_TENDER_SCHEMA)
+    """
+    Безопасная глубокая копия схемы, чтобы не ломать шаблон.
+    orjson держит кэш ключей, и копии делят одни и те же строки-ключи;
+    stdlib json создаёт ключи заново на каждый разбор, поэтому без orjson
+    копируем шаблон напрямую — ключи общие для всех словарей-результатов.
+    """
+    if orjson is not None:
+        return orjson.loads(_SCHEMA_JSON)
+    return _copy_template(UNIFIED_TENDER_SCHEMA)
 
 
 # ---------------------------
 # Разбиение текста на чанки
 # ---------------------------
-def _split_text(text: str, chunk_size: int = 20000, overlap: int = 500) -> List[str]:
+def _chunk_bounds(text: str, chunk_size: int, overlap: int) -> Iterator[Tuple[int, int]]:
     """
-    Режем текст на крупные чанки, чтобы уменьшить количество LLM-запросов.
+    Границы чанков (start, end). Конец чанка по возможности переносим на
+    ближайший разрыв абзаца "\n\n" в пределах последних overlap символов,
+    чтобы не резать запись посреди строки.
     """
-    text = (text or "").strip()
-    if not text:
-        return []
-    if len(text) <= chunk_size:
-        return [text]
-
-    chunks: List[str] = []
     n = len(text)
     start = 0
-
     while start < n:
         end = min(start + chunk_size, n)
-        chunk = text[start:end]
-        chunks.append(chunk)
+        if end < n:
+            cut = text.rfind("\n\n", max(start + 1, end - overlap), end)
+            if cut != -1:
+                end = cut
+        yield start, end
         if end == n:
             break
-        start = end - overlap
+        start = max(end - overlap, start + 1)
+
 
-    return chunks
+def _count_chunks(text: str, chunk_size: int = 20000, overlap: int = 500) -> int:
+    """Число чанков, которое выдаст _split_text (без копирования подстрок)."""
+    text = (text or "").strip()
+    if not text:
+        return 0
+    return sum(1 for _ in _chunk_bounds(text, chunk_size, overlap))
+
+
+def _split_text(text: str, chunk_size: int = 20000, overlap: int = 500) -> Iterator[str]:
+    """
+    Режем текст на крупные чанки, чтобы уменьшить количество LLM-запросов.
+    Генератор: чанки создаются по одному, по мере обработки.
+    """
+    text = (text or "").strip()
+    if not text:
+        return
+    for start, end in _chunk_bounds(text, chunk_size, overlap):
+        yield text[start:end]
 
 
 # ---------------------------
@@ -277,42 +429,26 @@ def _fallback_parse(text: str) -> Dict[str, Any]:
     - объект закупки и адрес;
     - перечень работ/товаров с объёмами и единицами, если видны.
     """
-    lines = [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
+    # strip один раз на строку, цикл целиком в C (map/filter)
+    lines = list(filter(None, map(str.strip, (text or "").splitlines())))
     raw = text or ""
 
-    # ----- 1) Заголовок -----
-    title = ""
-    for ln in lines[:20]:
-        low = ln.lower()
-        if any(
-            w in low
-            for w in [
-                "поставка",
-                "оказание услуг",
-                "оказание услуги",
-                "выполнение работ",
-                "строитель",
-                "ремонт",
-            ]
-        ):
-            title = ln
-            break
-    if not title and lines:
-        title = lines[0]
-
-    title = title.strip().rstrip(" .")
-
     # ----- 2) Краткое описание -----
     description = ""
     if raw:
-        clean = re.sub(r"\s+", " ", " ".join(lines[:50]))
-        sentences = re.split(r"[.!?]+\s", clean)
+        clean = _RE_SPACES.sub(" ", " ".join(lines[:50]))
+        # Нужны только первые три предложения — остальное не режем
+        sentences = _RE_SENTENCE_END.split(clean, maxsplit=3)
         if len(sentences) >= 3:
             description = ". ".join(sentences[:3])
         else:
             description = clean[:600]
 
-    # ----- 3) Заказчик, ИНН/КПП/ОГРН, контакты -----
+    # ----- 1, 3-6) Заголовок, заказчик, объект, работы, товары, количество -----
+    # Один проход по строкам: ln.lower() считаем один раз, регулярки запускаем
+    # только после дешёвых проверок подстрок.
+    title = ""
+
     customer_name = ""
     customer_inn = ""
     customer_kpp = ""
@@ -320,141 +456,133 @@ def _fallback_parse(text: str) -> Dict[str, Any]:
     customer_address = ""
     customer_contacts = ""
 
-    for ln in lines:
-        low = ln.lower()
-
-        if not customer_name and low.startswith("заказчик"):
-            customer_name = ln.split(":", 1)[-1].strip()
-
-        if "инн" in low and not customer_inn:
-            nums = re.findall(r"\b\d{10,12}\b", ln)
-            if nums:
-                customer_inn = nums[0]
-
-        if "кпп" in low and not customer_kpp:
-            nums = re.findall(r"\b\d{9}\b", ln)
-            if nums:
-                customer_kpp = nums[0]
-
-        if "огрн" in low and not customer_ogrn:
-            nums = re.findall(r"\b\d{13}\b", ln)
-            if nums:
-                customer_ogrn = nums[0]
-
-        if "тел" in low or "email" in low or "почт" in low:
-            customer_contacts = ln
-
-    # ----- 4) Объект закупки / адрес -----
     object_name = ""
     object_address = ""
 
-    for ln in lines:
+    works: List[Dict[str, Any]] = []
+    goods_items: List[Dict[str, Any]] = []
+    # Последняя найденная позиция — из любого из двух списков
+    last_item: Optional[Dict[str, Any]] = None
+
+    # Специальный случай: количество из "Количество, шт"
+    qty = ""
+    unit_hint = ""
+    qty_search = True
+
+    for idx, ln in enumerate(lines):
         low = ln.lower()
-        if low.startswith("объект"):
-            object_name = ln.split(":", 1)[-1].strip()
-        if "место постав" in low or "адрес" in low:
-            parts = ln.split(":", 1)
-            if len(parts) == 2:
-                object_address = parts[1].strip()
 
-    if not object_name:
-        object_name = title
+        if not title and idx < 20 and any(w in low for w in _TITLE_KEYWORDS):
+            title = ln
 
-    # ----- 5) Перечень работ (с объёмами и единицами) -----
-    works: List[Dict[str, Any]] = []
-    pattern = re.compile(
-        r"(.+?)\s+([\d\s\.,]+)\s*(шт|штук|м2|м3|м³|м|тонн|т|кг|литр|л|ед|упак|компл|пог\.м|п\.м\.)",
-        re.IGNORECASE,
-    )
+        # Каждая позиция попадает ровно в один список: либо работы, либо товары
+        m = _RE_ITEM.search(ln) if _RE_HAS_DIGIT.search(ln) else None
+        if m:
+            name = m.group(1).strip()
+            amount = m.group(2).strip()
+            unit = m.group(3)
+            name_low = name.lower()
+            if unit.lower() in _WORK_ONLY_UNITS or any(w in name_low for w in _WORK_KEYWORDS):
+                last_item = {
+                    "name": name,
+                    "volume": amount,
+                    "unit": unit,
+                    "materials": "",
+                    "equipment": "",
+                    "location": "",
+                    "notes": "",
+                }
+                works.append(last_item)
+            else:
+                last_item = {
+                    "name": name,
+                    "description": "",
+                    "brand": "",
+                    "model": "",
+                    "certificates": "",
+                    "quantity": amount,
+                    "unit": unit,
+                    "requirements": "",
+                }
+                goods_items.append(last_item)
 
-    for ln in lines:
-        m = pattern.search(ln)
-        if not m:
+        # Строки без единого ключевого слова полей (большинство строк ТЗ)
+        # отсекаем одним поиском вместо десятка проверок подстрок
+        if _RE_FIELD_KEYWORDS.search(low) is None:
             continue
 
-        name = m.group(1).strip()
-        volume = m.group(2).strip()
-        unit = m.group(3)
+        if not customer_name and low.startswith("заказчик"):
+            head, sep, tail = ln.partition(":")
+            customer_name = (tail if sep else head).strip()
 
-        works.append(
-            {
-                "name": name,
-                "volume": volume,
-                "unit": unit,
-                "materials": "",
-                "equipment": "",
-                "location": "",
-                "notes": "",
-            }
-        )
+        if not customer_inn and "инн" in low:
+            m = _RE_INN.search(ln)
+            if m:
+                customer_inn = m.group(0)
 
-    # ----- 6) Перечень товаров (если есть таблица с товарами) -----
-    goods_items: List[Dict[str, Any]] = []
-    goods_pattern = re.compile(
-        r"(.+?)\s+([\d\s\.,]+)\s*(шт|штук|м2|м3|м³|м|тонн|т|кг|литр|л|ед|упак|компл)",
-        re.IGNORECASE,
-    )
+        if not customer_kpp and "кпп" in low:
+            m = _RE_KPP.search(ln)
+            if m:
+                customer_kpp = m.group(0)
 
-    for ln in lines:
-        m = goods_pattern.search(ln)
-        if not m:
-            continue
-
-        name = m.group(1).strip()
-        qty = m.group(2).strip()
-        unit = m.group(3)
+        if not customer_ogrn and "огрн" in low:
+            m = _RE_OGRN.search(ln)
+            if m:
+                customer_ogrn = m.group(0)
 
-        goods_items.append(
-            {
-                "name": name,
-                "description": "",
-                "brand": "",
-                "model": "",
-                "certificates": "",
-                "quantity": qty,
-                "unit": unit,
-                "requirements": "",
-            }
-        )
+        if "тел" in low or "email" in low or "почт" in low:
+            customer_contacts = ln
 
-    # ----- 6.1) Специальный случай: количество из "Количество, шт" -----
-    qty = ""
-    unit_hint = ""
-    for idx, ln in enumerate(lines):
-        low = ln.lower()
-        if "количество" in low and ("шт" in low or "штук" in low or "ед" in low or "компл" in low):
-            if "шт" in low or "штук" in low:
-                unit_hint = "шт"
-            nums = re.findall(r"\b\d{1,6}\b", ln)
-            if nums:
-                qty = nums[-1]
-                break
+        if low.startswith("объект"):
+            head, sep, tail = ln.partition(":")
+            object_name = (tail if sep else head).strip()
+        if "место постав" in low or "адрес" in low:
+            _, sep, tail = ln.partition(":")
+            if sep:
+                object_address = tail.strip()
 
-        if "количество, шт" in low:
-            for j in range(idx + 1, min(len(lines), idx + 20)):
-                row = lines[j]
-                nums = re.findall(r"\b\d{1,6}\b", row)
+        if qty_search and "количество" in low:
+            if "шт" in low or "штук" in low or "ед" in low or "компл" in low:
+                if "шт" in low or "штук" in low:
+                    unit_hint = "шт"
+                nums = _RE_QTY.findall(ln)
                 if nums:
                     qty = nums[-1]
-                    unit_hint = "шт"
-                    break
-            break
+                    qty_search = False
+                    continue
+
+            if "количество, шт" in low:
+                for j in range(idx + 1, min(len(lines), idx + 20)):
+                    nums = _RE_QTY.findall(lines[j])
+                    if nums:
+                        qty = nums[-1]
+                        unit_hint = "шт"
+                        break
+                qty_search = False
+
+    if not title and lines:
+        title = lines[0]
+    title = title.strip().rstrip(" .")
+
+    if not object_name:
+        object_name = title
 
     if qty:
-        target_goods = None
-        for g in goods_items:
-            if not isinstance(g, dict):
-                continue
+        # Позиция могла уйти и в товары, и в работы: ищем сваи в обоих списках,
+        # иначе берём последнюю найденную позицию
+        target_item = None
+        for g in goods_items + works:
             nm = (g.get("name") or "").lower()
             if any(w in nm for w in ("сваи", "свая", "свай")):
-                target_goods = g
+                target_item = g
                 break
-        if target_goods is None and goods_items:
-            target_goods = goods_items[-1]
-        if target_goods is not None:
-            target_goods["quantity"] = qty
-            if not target_goods.get("unit"):
-                target_goods["unit"] = unit_hint or target_goods.get("unit") or "шт"
+        if target_item is None:
+            target_item = last_item
+        if target_item is not None:
+            # у товара количество — quantity, у работы — volume
+            target_item["quantity" if "quantity" in target_item else "volume"] = qty
+            if not target_item.get("unit"):
+                target_item["unit"] = unit_hint or "шт"
 
     # ----- 7) Сборка результата -----
     result = _deep_copy_schema()
@@ -479,9 +607,55 @@ def _fallback_parse(text: str) -> Dict[str, Any]:
     return result
 
 
+# Результаты _fallback_parse по хэшу текста: повторный анализ того же
+# документа (перезапуск из UI, ретраи) не гоняет регулярки заново.
+# Храним JSON-строку — на выдаче каждый раз свежая копия, как у схемы.
+FALLBACK_CACHE_MAXSIZE = 32
+_fallback_cache: "OrderedDict[Tuple[int, str], str]" = OrderedDict()
+_fallback_cache_lock = threading.Lock()
+
+
+def _fallback_parse_cached(text: str) -> Dict[str, Any]:
+    raw = text or ""
+    key = (len(raw), hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest())
+    with _fallback_cache_lock:
+        cached = _fallback_cache.get(key)
+        if cached is not None:
+            _fallback_cache.move_to_end(key)
+    if cached is None:
+        cached = json.dumps(_fallback_parse(raw), ensure_ascii=False)
+        with _fallback_cache_lock:
+            _fallback_cache[key] = cached
+            while len(_fallback_cache) > FALLBACK_CACHE_MAXSIZE:
+                _fallback_cache.popitem(last=False)
+    return _loads(cached)
+
+
 # ---------------------------
 # Нормализация к схеме
 # ---------------------------
+_SCALAR, _LIST, _DICT = 0, 1, 2
+
+
+def _compile_schema_spec(template: Dict[str, Any]) -> Tuple[frozenset, Tuple[Tuple[str, int, Any], ...]]:
+    """
+    Описание уровня схемы: (множество ключей, ((ключ, вид, описание вложенного уровня), ...)).
+    Строится один раз при импорте, чтобы не разбирать типы шаблона на каждом вызове.
+    """
+    fields = []
+    for k, v in template.items():
+        if isinstance(v, dict):
+            fields.append((k, _DICT, _compile_schema_spec(v)))
+        elif isinstance(v, list):
+            fields.append((k, _LIST, None))
+        else:
+            fields.append((k, _SCALAR, None))
+    return frozenset(template), tuple(fields)
+
+
+_SCHEMA_SPEC = _compile_schema_spec(UNIFIED_TENDER_SCHEMA)
+
+
 def _normalize_to_schema(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Приводим произвольный словарь к UNIFIED_TENDER_SCHEMA:
@@ -489,32 +663,33 @@ def _normalize_to_schema(data: Dict[str, Any]) -> Dict[str, Any]:
     - дополнительные поля (например, market_analysis, performers_by_task)
       сохраняем как есть и не выкидываем.
     """
+    # Начинаем со свежей копии схемы (там уже все значения по умолчанию)
+    # и обходим уровни итеративно, без рекурсии
+    out = _deep_copy_schema()
+    stack = [(out, data, _SCHEMA_SPEC)]
+    while stack:
+        o, d, (keys, fields) = stack.pop()
+        if not isinstance(d, dict):
+            continue
 
-    def _fill(template: Any, d: Any) -> Any:
-        if isinstance(template, dict):
-            out: Dict[str, Any] = {}
-            d = d if isinstance(d, dict) else {}
-
-            # 1) заполняем всё, что есть в шаблоне
-            for k, v in template.items():
-                out[k] = _fill(v, d.get(k))
-
-            # 2) аккуратно добавляем «лишние» ключи из исходного словаря
-            for k, v in d.items():
-                if k not in template:
-                    out[k] = v
-
-            return out
+        # 1) заполняем всё, что есть в шаблоне
+        for k, kind, sub in fields:
+            v = d.get(k)
+            if kind == _DICT:
+                stack.append((o[k], v, sub))
+            elif kind == _LIST:
+                if isinstance(v, list):
+                    o[k] = v
+            elif v not in (None, ""):
+                o[k] = v
 
-        elif isinstance(template, list):
-            if isinstance(d, list):
-                return d
-            return copy.deepcopy(template)
+        # 2) аккуратно добавляем «лишние» ключи из исходного словаря
+        #    (ключи интернируем: одинаковые ключи разных тендеров — одна строка)
+        for k, v in d.items():
+            if k not in keys:
+                o[sys.intern(k) if type(k) is str else k] = v
 
-        else:
-            return d if d not in (None, "") else template
-
-    return _fill(UNIFIED_TENDER_SCHEMA, data)
+    return out
 
 
 # ---------------------------
@@ -530,7 +705,7 @@ def _beautify_title(title: str) -> str:
 
     # "Техническое задание\nна поставку ..." -> "Поставка ..."
     if low.startswith("техническое задание"):
-        m = re.search(r"на\s+(.+)", t, flags=re.IGNORECASE)
+        m = _RE_TITLE_NA.search(t)
         if m:
             t = m.group(1).strip()
             low = t.lower()
@@ -549,122 +724,72 @@ def _beautify_title(title: str) -> str:
             t = rest[:1].upper() + rest[1:]
 
     # сносим ведущую нумерацию "2.2." и т.п.
-    t = re.sub(r"^[\d\.\)\s]+", "", t).strip()
+    t = _RE_LEAD_NUM.sub("", t).strip()
 
     return t[:200]
 
 
-def _postprocess_fields(
-    tender_data: Dict[str, Any],
-    fallback_data: Dict[str, Any],
+def _looks_like_contacts(s: str) -> bool:
+    if not s:
+        return False
+    low = s.lower()
+    if any(tok in low for tok in _CONTACT_TOKENS):
+        return True
+    return _RE_PHONE.search(low) is not None
+
+
+def _trim(v: str, max_len: int = 260) -> str:
+    """Обрезаем строку до разумной длины."""
+    v = (v or "").strip()
+    return v if len(v) <= max_len else v[: max_len - 3].rstrip() + "..."
+
+
+def _normalize_and_merge(
+    primary: Dict[str, Any],
+    fallback: Dict[str, Any],
 ) -> Dict[str, Any]:
     """
-    Старый рабочий постпроцессинг:
+    Приводим основной результат (LLM или fallback) к схеме и сразу
+    делаем постпроцессинг, без промежуточного словаря:
     - нормализуем title (убираем ОКПД, хвосты и т.п.)
     - аккуратно заполняем object.name
+    - имя/адрес заказчика дозаполняем из fallback, если основное поле пустое
     - контакты берём только если действительно похожи на контакты
     - обрезаем слишком длинные поля
     """
-    td = tender_data
-
-    # --- title ---
-    model_title = (td.get("title") or "").strip()
-    fb_title = (fallback_data.get("title") or "").strip()
-    if model_title:
-        td["title"] = _beautify_title(model_title)
-    elif fb_title:
-        td["title"] = _beautify_title(fb_title)
-    else:
-        td["title"] = ""
-
-    # --- object.name ---
-    obj = td.get("object") or {}
-    model_obj_name = (obj.get("name") or "").strip()
-    fb_obj = fallback_data.get("object") or {}
-    fb_obj_name = (fb_obj.get("name") or "").strip()
-
-    if model_obj_name:
-        obj["name"] = _beautify_title(model_obj_name)
-    elif fb_obj_name:
-        obj["name"] = _beautify_title(fb_obj_name)
-    else:
-        obj["name"] = ""
-
-    td["object"] = obj
-
-    # --- customer: дозаполнение из fallback, если LLM поле не заполнила ---
-    cust = td.get("customer") or {}
-    fb_cust = fallback_data.get("customer") or {}
-
-    model_cust_name = (cust.get("name") or "").strip()
-    fb_cust_name = (fb_cust.get("name") or "").strip()
-
-    model_cust_addr = (cust.get("address") or "").strip()
-    fb_cust_addr = (fb_cust.get("address") or "").strip()
-
-    if not model_cust_name and fb_cust_name:
-        cust["name"] = fb_cust_name
-
-    if not model_cust_addr and fb_cust_addr:
-        cust["address"] = fb_cust_addr
-
-    td["customer"] = cust
-
-    # --- contacts: берём LLM-версию только если она реально похожа на контакты ---
-    fb_contacts = (fallback_data.get("customer", {}).get("contacts") or "").strip()
-    llm_contacts = (td.get("customer", {}).get("contacts") or "").strip()
-    td.setdefault("customer", {})
-    # --- customer: если LLM не заполнил имя/адрес, аккуратно добираем из fallback ---
-    cust = td.get("customer") or {}
-    fb_cust = fallback_data.get("customer") or {}
-
-    model_cust_name = (cust.get("name") or "").strip()
-    fb_cust_name = (fb_cust.get("name") or "").strip()
-
-    model_cust_addr = (cust.get("address") or "").strip()
-    fb_cust_addr = (fb_cust.get("address") or "").strip()
-
-    if not model_cust_name and fb_cust_name:
-        cust["name"] = fb_cust_name
-
-    if not model_cust_addr and fb_cust_addr:
-        cust["address"] = fb_cust_addr
-
-    td["customer"] = cust
-
-    # --- contacts: берём LLM-версию только если она реально похожа на контакты ---
-    fb_contacts = (fallback_data.get("customer", {}).get("contacts") or "").strip()
-    llm_contacts = (td.get("customer", {}).get("contacts") or "").strip()
-    td.setdefault("customer", {})
-
-    def _looks_like_contacts(s: str) -> bool:
-        if not s:
-            return False
-        low = s.lower()
-        if any(tok in low for tok in ("тел", "phone", "факс", "e-mail", "email")):
-            return True
-        if "@" in low:
-            return True
-        if re.search(r"\+7\d{10}", low) or re.search(r"\b8\d{10}\b", low):
-            return True
-        return False
-
-    if _looks_like_contacts(llm_contacts):
-        td["customer"]["contacts"] = llm_contacts
-    elif _looks_like_contacts(fb_contacts):
-        td["customer"]["contacts"] = fb_contacts
-    else:
-        td["customer"]["contacts"] = ""
+    td = _normalize_to_schema(primary)
+    # после нормализации object и customer — всегда словари
+    obj = td["object"]
+    cust = td["customer"]
+    fb_obj = fallback.get("object") or {}
+    fb_cust = fallback.get("customer") or {}
+
+    # --- title / object.name: основное значение, иначе fallback ---
+    title = (td.get("title") or "").strip() or (fallback.get("title") or "").strip()
+    td["title"] = _beautify_title(title)
+    obj_name = (obj.get("name") or "").strip() or (fb_obj.get("name") or "").strip()
+    obj["name"] = _beautify_title(obj_name)
+
+    # --- customer: дозаполнение из fallback, если основное поле пустое ---
+    for key in ("name", "address"):
+        if not (cust.get(key) or "").strip():
+            fb_val = (fb_cust.get(key) or "").strip()
+            if fb_val:
+                cust[key] = fb_val
+
+    # --- contacts: основную версию берём только если она реально похожа на контакты ---
+    contacts = (cust.get("contacts") or "").strip()
+    if not _looks_like_contacts(contacts):
+        contacts = (fb_cust.get("contacts") or "").strip()
+        if not _looks_like_contacts(contacts):
+            contacts = ""
+    cust["contacts"] = contacts
 
     # остальное – просто обрезаем до разумной длины
-    def _trim(v: str, max_len: int = 260) -> str:
-        v = (v or "").strip()
-        return v if len(v) <= max_len else v[: max_len - 3].rstrip() + "..."
-
     td["description"] = _trim(td.get("description", ""))
-    td["customer"]["name"] = _trim(td.get("customer", {}).get("name", ""))
-    td["customer"]["address"] = _trim(td.get("customer", {}).get("address", ""))
-    td["object"]["address"] = _trim(td.get("object", {}).get("address", ""))
+    cust["name"] = _trim(cust.get("name", ""))
+    cust["address"] = _trim(cust.get("address", ""))
+    obj["address"] = _trim(obj.get("address", ""))
 
     return td
 
@@ -672,36 +797,39 @@ def _postprocess_fields(
 # ---------------------------
 # LLM: построение сообщений
 # ---------------------------
-def _build_llm_messages(chunk_text: str, user_city: Optional[str]) -> List[Dict[str, str]]:
-    schema_text = json.dumps(UNIFIED_TENDER_SCHEMA, ensure_ascii=False, indent=2)
+# Схема и системный промпт статичны — собираем их один раз при импорте,
+# а не на каждый чанк
+_SCHEMA_TEXT = _dumps(UNIFIED_TENDER_SCHEMA)
+
+_LLM_SYSTEM_MSG = (
+    "Ты — эксперт по анализу тендерной документации (44-ФЗ, 223-ФЗ и др.).\n"
+    "Твоя задача — извлечь структурированные данные из фрагмента тендерных документов "
+    "и вернуть СТРОГО ОДИН JSON-объект, строго соответствующий заданной схеме.\n\n"
+    "Документы могут быть любыми: техническое задание, проект контракта, извещение, "
+    "сведения о закупке, требования к заявке, НМЦК, переписка и т.п.\n\n"
+    "Особенно внимательно заполняй поля верхней таблицы отчёта:\n"
+    " • 'title' — краткое название закупки (например, 'Поставка свай винтовых'). "
+    "Не включай коды ОКПД, длинные юридические формулировки и лишние подробности.\n"
+    " • 'description' — 1–3 предложения, объясняющих суть закупки простым языком.\n"
+    " • 'customer.name' — официальное наименование заказчика. Ищи его в преамбуле "
+    "контрактов, в извещении, в реквизитах и т.п.\n"
+    " • 'customer.address' — официальный адрес заказчика (индекс, город, улица и т.п.). "
+    "Допустимо брать его из раздела о месте поставки, если он явно относится к заказчику.\n"
+    " • 'customer.contacts' — контактные данные (ФИО контактного лица, телефон, e-mail). "
+    "Никогда не подставляй сюда описание предмета закупки или характеристики товара.\n"
+    " • 'object.name' и 'object.address' — объект закупки и адрес объекта/поставки.\n\n"
+    "Обязательные правила:\n"
+    "1) Верни ТОЛЬКО JSON, без пояснений, комментариев и без ```.\n"
+    "2) JSON должен быть корректным и парситься через json.loads без ошибок.\n"
+    "3) Если каких-то данных нет в тексте — ставь пустые строки или null, не выдумывай значения.\n"
+    "4) Строго соблюдай структуру и типы полей, как в схеме ниже.\n"
+    "5) Все суммы указывай в числовом формате без пробелов, для строк валют используй коды "
+    "(например, 'RUB').\n\n"
+    f"Вот JSON-схема, которой НУЖНО строго следовать:\n{_SCHEMA_TEXT}"
+)
 
-    system_msg = (
-        "Ты — эксперт по анализу тендерной документации (44-ФЗ, 223-ФЗ и др.).\n"
-        "Твоя задача — извлечь структурированные данные из фрагмента тендерных документов "
-        "и вернуть СТРОГО ОДИН JSON-объект, строго соответствующий заданной схеме.\n\n"
-        "Документы могут быть любыми: техническое задание, проект контракта, извещение, "
-        "сведения о закупке, требования к заявке, НМЦК, переписка и т.п.\n\n"
-        "Особенно внимательно заполняй поля верхней таблицы отчёта:\n"
-        " • 'title' — краткое название закупки (например, 'Поставка свай винтовых'). "
-        "Не включай коды ОКПД, длинные юридические формулировки и лишние подробности.\n"
-        " • 'description' — 1–3 предложения, объясняющих суть закупки простым языком.\n"
-        " • 'customer.name' — официальное наименование заказчика. Ищи его в преамбуле "
-        "контрактов, в извещении, в реквизитах и т.п.\n"
-        " • 'customer.address' — официальный адрес заказчика (индекс, город, улица и т.п.). "
-        "Допустимо брать его из раздела о месте поставки, если он явно относится к заказчику.\n"
-        " • 'customer.contacts' — контактные данные (ФИО контактного лица, телефон, e-mail). "
-        "Никогда не подставляй сюда описание предмета закупки или характеристики товара.\n"
-        " • 'object.name' и 'object.address' — объект закупки и адрес объекта/поставки.\n\n"
-        "Обязательные правила:\n"
-        "1) Верни ТОЛЬКО JSON, без пояснений, комментариев и без ```.\n"
-        "2) JSON должен быть корректным и парситься через json.loads без ошибок.\n"
-        "3) Если каких-то данных нет в тексте — ставь пустые строки или null, не выдумывай значения.\n"
-        "4) Строго соблюдай структуру и типы полей, как в схеме ниже.\n"
-        "5) Все суммы указывай в числовом формате без пробелов, для строк валют используй коды "
-        "(например, 'RUB').\n\n"
-        f"Вот JSON-схема, которой НУЖНО строго следовать:\n{schema_text}"
-    )
 
+def _build_llm_messages(chunk_text: str, user_city: Optional[str]) -> List[Dict[str, str]]:
     user_msg = (
         f"Город/регион закупки (если известен пользователю): {user_city or 'не указан'}.\n\n"
         "Проанализируй приведённый ниже фрагмент тендерной документации и заполни все поля "
@@ -712,11 +840,43 @@ def _build_llm_messages(chunk_text: str, user_city: Optional[str]) -> List[Dict[
     )
 
     return [
-        {"role": "system", "content": system_msg},
+        {"role": "system", "content": _LLM_SYSTEM_MSG},
         {"role": "user", "content": user_msg},
     ]
 
 
+def _build_llm_batch_messages(chunk_texts: List[str], user_city: Optional[str]) -> List[Dict[str, str]]:
+    """Несколько фрагментов в одном запросе; ответ — {"chunks": [объект схемы на каждый фрагмент]}."""
+    parts = "\n\n".join(
+        f"===ФРАГМЕНТ {i}===\n{chunk_text}" for i, chunk_text in enumerate(chunk_texts, start=1)
+    )
+    user_msg = (
+        f"Город/регион закупки (если известен пользователю): {user_city or 'не указан'}.\n\n"
+        f"Ниже {len(chunk_texts)} фрагмента(ов) тендерной документации, каждый начинается "
+        "со строки ===ФРАГМЕНТ N===. Для КАЖДОГО фрагмента отдельно заполни все поля схемы, "
+        "которые можно надёжно извлечь из его текста. Если данных недостаточно — оставь "
+        "соответствующие поля пустыми.\n\n"
+        f"{parts}\n\n"
+        'Верни ОДИН JSON-объект вида {"chunks": [...]}, где в массиве chunks ровно '
+        f"{len(chunk_texts)} объекта(ов) по схеме — по одному на фрагмент, в том же порядке. "
+        "Никакого текста до или после JSON."
+    )
+
+    return [
+        {"role": "system", "content": _LLM_SYSTEM_MSG},
+        {"role": "user", "content": user_msg},
+    ]
+
+
+def _parse_llm_chunk(raw: Dict[str, Any], chunk_index: int) -> Optional[Dict[str, Any]]:
+    content = raw["choices"][0]["message"]["content"]
+    parsed = parse_json_from_text(content)
+    if isinstance(parsed, dict):
+        return parsed
+    logger.warning("LLM не вернул dict для чанка %s", chunk_index)
+    return None
+
+
 def _call_llm_chunk(
     provider: Any,
     chunk_text: str,
@@ -724,21 +884,176 @@ def _call_llm_chunk(
     chunk_index: int,
     total_chunks: int,
 ) -> Optional[Dict[str, Any]]:
-    logger.info("LLM call chunk %s/%s", chunk_index, total_chunks)
     messages = _build_llm_messages(chunk_text, user_city)
+    raw = _llm_cache.get(MODEL_NAME, messages, EXTRACTION_TEMPERATURE)
+    if raw is not None:
+        logger.info("LLM chunk %s/%s: ответ из кэша", chunk_index, total_chunks)
+        return _parse_llm_chunk(raw, chunk_index)
+
+    logger.info("LLM call chunk %s/%s", chunk_index, total_chunks)
     try:
-        raw = provider.generate(messages=messages, model=MODEL_NAME)
-        content = raw["choices"][0]["message"]["content"]
-        parsed = parse_json_from_text(content)
-        if isinstance(parsed, dict):
-            return parsed
-        logger.warning("LLM не вернул dict для чанка %s", chunk_index)
-        return None
+        raw = provider.generate(messages=messages, model=MODEL_NAME, temperature=EXTRACTION_TEMPERATURE)
+        parsed = _parse_llm_chunk(raw, chunk_index)
+        if parsed is not None:
+            _llm_cache.set(MODEL_NAME, messages, EXTRACTION_TEMPERATURE, raw)
+        return parsed
     except Exception as e:  # pragma: no cover
         logger.warning("Ошибка LLM на чанке %s: %s", chunk_index, e)
         return None
 
 
+async def _call_llm_chunk_async(
+    provider: Any,
+    chunk_text: str,
+    user_city: Optional[str],
+    chunk_index: int,
+    total_chunks: int,
+    semaphore: asyncio.Semaphore,
+) -> Optional[Dict[str, Any]]:
+    messages = _build_llm_messages(chunk_text, user_city)
+    raw = _llm_cache.get(MODEL_NAME, messages, EXTRACTION_TEMPERATURE)
+    if raw is not None:
+        logger.info("LLM chunk %s/%s: ответ из кэша", chunk_index, total_chunks)
+        return _parse_llm_chunk(raw, chunk_index)
+
+    async with semaphore:
+        logger.info("LLM call chunk %s/%s", chunk_index, total_chunks)
+        try:
+            agenerate = getattr(provider, "agenerate", None)
+            if agenerate is not None:
+                raw = await agenerate(messages=messages, model=MODEL_NAME, temperature=EXTRACTION_TEMPERATURE)
+            else:
+                raw = await asyncio.to_thread(
+                    provider.generate, messages=messages, model=MODEL_NAME, temperature=EXTRACTION_TEMPERATURE
+                )
+            parsed = _parse_llm_chunk(raw, chunk_index)
+            if parsed is not None:
+                _llm_cache.set(MODEL_NAME, messages, EXTRACTION_TEMPERATURE, raw)
+            return parsed
+        except Exception as e:  # pragma: no cover
+            logger.warning("Ошибка LLM на чанке %s: %s", chunk_index, e)
+            return None
+
+
+def _parse_llm_batch(raw: Dict[str, Any], count: int) -> Optional[List[Dict[str, Any]]]:
+    content = raw["choices"][0]["message"]["content"]
+    parsed = parse_json_from_text(content)
+    items = parsed.get("chunks") if isinstance(parsed, dict) else None
+    if isinstance(items, list) and len(items) == count and all(isinstance(x, dict) for x in items):
+        return items
+    return None
+
+
+async def _call_llm_batch_async(
+    provider: Any,
+    chunk_texts: List[str],
+    user_city: Optional[str],
+    first_index: int,
+    total_chunks: int,
+    semaphore: asyncio.Semaphore,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Несколько чанков одним запросом к LLM. Если ответ не разобрался
+    (не тот формат / не то число объектов) — запрашиваем чанки по одному.
+    """
+    if len(chunk_texts) == 1:
+        return [
+            await _call_llm_chunk_async(
+                provider, chunk_texts[0], user_city, first_index, total_chunks, semaphore
+            )
+        ]
+
+    last_index = first_index + len(chunk_texts) - 1
+    messages = _build_llm_batch_messages(chunk_texts, user_city)
+    items = None
+    raw = _llm_cache.get(MODEL_NAME, messages, EXTRACTION_TEMPERATURE)
+    if raw is not None:
+        logger.info("LLM chunks %s-%s/%s: ответ из кэша", first_index, last_index, total_chunks)
+        items = _parse_llm_batch(raw, len(chunk_texts))
+    else:
+        async with semaphore:
+            logger.info("LLM call chunks %s-%s/%s", first_index, last_index, total_chunks)
+            try:
+                agenerate = getattr(provider, "agenerate", None)
+                kwargs = {
+                    "messages": messages,
+                    "model": MODEL_NAME,
+                    "temperature": EXTRACTION_TEMPERATURE,
+                    # ответ на каждый фрагмент — отдельный объект схемы
+                    "max_tokens": LLM_CHUNK_MAX_TOKENS * len(chunk_texts),
+                }
+                if agenerate is not None:
+                    raw = await agenerate(**kwargs)
+                else:
+                    raw = await asyncio.to_thread(provider.generate, **kwargs)
+                items = _parse_llm_batch(raw, len(chunk_texts))
+                if items is not None:
+                    _llm_cache.set(MODEL_NAME, messages, EXTRACTION_TEMPERATURE, raw)
+            except Exception as e:  # pragma: no cover
+                logger.warning("Ошибка LLM на чанках %s-%s: %s", first_index, last_index, e)
+
+    if items is not None:
+        return items
+
+    logger.warning(
+        "Пакетный ответ LLM для чанков %s-%s не разобран, запрашиваем их по одному",
+        first_index,
+        last_index,
+    )
+    return list(
+        await asyncio.gather(
+            *(
+                _call_llm_chunk_async(provider, chunk_text, user_city, idx, total_chunks, semaphore)
+                for idx, chunk_text in enumerate(chunk_texts, start=first_index)
+            )
+        )
+    )
+
+
+def _event_loop_running() -> bool:
+    """True, если в текущем потоке уже работает event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def _call_llm_chunks_async(
+    provider: Any,
+    text: str,
+    user_city: Optional[str],
+    total_chunks: int,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Чанки группируются по LLM_CHUNK_BATCH_SIZE в один запрос, запросы уходят
+    в LLM параллельно (не более LLM_CHUNK_CONCURRENCY одновременно) через
+    общий пул соединений провайдера. Результаты — в порядке чанков.
+    """
+    chunks = list(_split_text(text))
+    batches = [
+        chunks[i:i + LLM_CHUNK_BATCH_SIZE] for i in range(0, len(chunks), LLM_CHUNK_BATCH_SIZE)
+    ]
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+    try:
+        results = await asyncio.gather(
+            *(
+                _call_llm_batch_async(
+                    provider, batch, user_city, 1 + n * LLM_CHUNK_BATCH_SIZE, total_chunks, semaphore
+                )
+                for n, batch in enumerate(batches)
+            )
+        )
+        return [item for batch_result in results for item in batch_result]
+    finally:
+        aclose = getattr(provider, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+
 # ---------------------------
 # Слияние нескольких словарей
 # ---------------------------
@@ -748,36 +1063,65 @@ def _merge_dicts(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
     - словари мёрджим по ключам;
     - списки конкатенируем;
     - скаляры из extra перекрывают base, если не пустые.
+
+    base изменяется на месте. Списки из extra копируются, а не кладутся
+    в base по ссылке, чтобы последующие слияния не меняли extra.
     """
     if not isinstance(extra, dict):
         return base
 
     for k, v in extra.items():
         if isinstance(v, dict):
-            node = base.get(k) or {}
+            node = base.get(k)
             if not isinstance(node, dict):
                 node = {}
-            base[k] = _merge_dicts(node, v)
+                base[k] = node
+            _merge_dicts(node, v)
         elif isinstance(v, list):
             base_list = base.get(k)
             if isinstance(base_list, list):
-                base[k] = base_list + v
+                base_list.extend(v)
             else:
-                base[k] = v
+                base[k] = list(v)
+        elif v is None or v == "":
+            continue
         else:
-            if v not in ("", None, []):
-                base[k] = v
+            base[k] = v
 
     return base
 
 
-def _aggregate_tender_dicts(dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
-    dicts = [d for d in dicts if isinstance(d, dict) and d]
-    if not dicts:
-        return _deep_copy_schema()
-    agg: Dict[str, Any] = _deep_copy_schema()
+def _fold_tender_dicts(dicts: Iterable[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Сливает словари в один по мере поступления (dicts может быть генератором):
+    в памяти держим только агрегат, а не все ответы по чанкам сразу.
+    Возвращает None, если ни одного непустого словаря не пришло.
+
+    Единственный словарь возвращается как есть, без слияния (частый случай —
+    документ в один чанк). Значения по умолчанию добавляет уже
+    _normalize_to_schema, поэтому агрегат не стартует с копии схемы: иначе
+    к спискам работ/товаров приклеивалась бы пустая строка-шаблон.
+    """
+    agg: Optional[Dict[str, Any]] = None
+    copied = False
     for d in dicts:
-        agg = _merge_dicts(agg, d)
+        if not isinstance(d, dict) or not d:
+            continue
+        if agg is None:
+            agg = d
+            continue
+        if not copied:
+            # первый словарь не трогаем: сливаем в его копию
+            agg = _merge_dicts({}, agg)
+            copied = True
+        _merge_dicts(agg, d)
+    return agg
+
+
+def _aggregate_tender_dicts(dicts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    agg = _fold_tender_dicts(dicts)
+    if agg is None:
+        return _deep_copy_schema()
     return _normalize_to_schema(agg)
 
 
@@ -885,6 +1229,50 @@ def _extract_works_for_pricing(tender_data: Dict[str, Any]) -> List[Dict[str, An
 
 
 
+@dataclass(slots=True)
+class PerformerEntry:
+    """Исполнитель по работе; в dict для JSON превращается только в самом конце."""
+    name: str
+    profile_url: str
+    rating: Any
+    price_min: Any
+    price_max: Any
+    unit: str
+    currency: str
+    phone: str
+    email: str
+
+
+def _performer_to_dict(p: PerformerEntry) -> Dict[str, Any]:
+    return {
+        "name": p.name,
+        "type": "поставщик",  # при желании можно варьировать
+        "profile_url": p.profile_url,
+        "reviews": {
+            "average_rating": p.rating if p.rating is not None else "",
+            "reviews": [],
+        },
+        "prices": [
+            {
+                "value_min": p.price_min,
+                "value_max": p.price_max,
+                "unit": p.unit,
+                "currency": p.currency,
+                "source": "places_api",
+            }
+        ],
+        "contacts": {
+            "phone": p.phone,
+            "email": p.email,
+        },
+    }
+
+
+def _r2(x: Any) -> Any:
+    """Округление суммы до копеек; нечисловое значение — пустая строка."""
+    return round(x, 2) if isinstance(x, (int, float)) else ""
+
+
 def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
     """
     Старая рабочая логика:
@@ -897,11 +1285,14 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
     if not works:
         return
 
-    service = SearchService()
+    service = get_search_service()
+    search_city = city or "Россия"
     rows: List[Dict[str, Any]] = []
     total_min = 0.0
     total_max = 0.0
+    priced = 0
 
+    items = []
     for w in works:
         name = (w.get("name") or "").strip()
         if not name:
@@ -914,12 +1305,25 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
             volume = 1.0
 
         unit = (w.get("unit") or "").strip() or "шт"
+        items.append((name, volume, unit))
 
+    def _lookup(name: str) -> Any:
         try:
-            price_info = service.search_prices(task=name, city=city or "Россия")
+            return service.search_prices(task=name, city=search_city)
         except Exception as e:  # pragma: no cover
             logger.warning("Ошибка поиска цен для '%s': %s", name, e)
-            price_info = None
+            return None
+
+    # Поиск цен — сетевые запросы: отправляем их параллельно (по одному на
+    # уникальное название), порядок строк сохраняется
+    names = list(dict.fromkeys(name for name, _, _ in items))
+    price_by_name: Dict[str, Any] = {}
+    if names:
+        with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(names))) as pool:
+            price_by_name = dict(zip(names, pool.map(_lookup, names)))
+
+    for name, volume, unit in items:
+        price_info = price_by_name[name]
 
         if price_info and getattr(price_info, "ok", False) and price_info.price_min is not None:
             pmn = float(price_info.price_min)
@@ -928,6 +1332,7 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
             subtotal_max = pmx * volume
             total_min += subtotal_min
             total_max += subtotal_max
+            priced += 1
 
             row = {
                 "status": "calculated",
@@ -956,15 +1361,42 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
     # пишем обратно в tender
     ma = tender.setdefault("market_analysis", {})
     calc = ma.setdefault("minimum_sum_calculation", {})
-    calc["total_min"] = round(total_min, 2) if total_min else ""
-    calc["total_max"] = round(total_max, 2) if total_max else ""
+    # итог пустой, только если не посчитано ни одной строки; нулевая сумма — тоже сумма
+    calc["total_min"] = _r2(total_min) if priced else ""
+    calc["total_max"] = _r2(total_max) if priced else ""
     calc["currency"] = "RUB"
     calc["confidence"] = "0.5"
     calc["works_breakdown"] = rows
-    calc["works_breakdown"] = rows
 
     # --- ищем исполнителей по каждой задаче через SearchService ---
-    performers_by_task: Dict[str, List[Dict[str, Any]]] = {}
+    entries_by_task: Dict[str, List[PerformerEntry]] = {}
+
+    # Поиск исполнителей — тоже сетевые запросы: по одному на уникальную
+    # работу (без учёта регистра), параллельно, в том же городе; результат
+    # раздаём всем строкам с этим названием
+    unique_works: Dict[str, str] = {}
+    for r in rows:
+        if isinstance(r, dict):
+            wn = (r.get("work_name") or "").strip()
+            if wn:
+                unique_works.setdefault(wn.lower(), wn)
+    performers_by_key: Dict[str, Any] = {}
+    if unique_works:
+        with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(unique_works))) as pool:
+            performers_by_key = dict(
+                zip(
+                    unique_works,
+                    pool.map(
+                        lambda wn: service.search_performers(wn, city=search_city, limit=5),
+                        unique_works.values(),
+                    ),
+                )
+            )
+
+    # единицы и валюты повторяются от строки к строке — нормализуем
+    # каждое исходное значение один раз
+    unit_cache: Dict[Any, str] = {}
+    currency_cache: Dict[Any, str] = {}
 
     for r in rows:
         if not isinstance(r, dict):
@@ -974,46 +1406,42 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
         if not work_name:
             continue
 
-        unit = (r.get("unit") or "").strip()
+        raw_unit = r.get("unit")
+        unit = unit_cache.get(raw_unit)
+        if unit is None:
+            unit = unit_cache[raw_unit] = (raw_unit or "").strip()
+        raw_currency = r.get("currency")
+        currency = currency_cache.get(raw_currency)
+        if currency is None:
+            currency = currency_cache[raw_currency] = (raw_currency or "RUB").strip() or "RUB"
         price_min = r.get("price_min")
         price_max = r.get("price_max")
-        currency = (r.get("currency") or "RUB").strip() or "RUB"
-
-        # обращаемся к поиску исполнителей в том же городе
-        performers = service.search_performers(work_name, city=city or "Россия", limit=5)
-
-        performer_entries: List[Dict[str, Any]] = []
-
-        for perf in performers:
-            entry: Dict[str, Any] = {
-                "name": perf.name,
-                "type": "поставщик",  # при желании можно варьировать
-                "profile_url": perf.site,
-                "reviews": {
-                    "average_rating": perf.rating if perf.rating is not None else "",
-                    "reviews": [],
-                },
-                "prices": [
-                    {
-                        "value_min": price_min,
-                        "value_max": price_max,
-                        "unit": unit,
-                        "currency": currency,
-                        "source": "places_api",
-                    }
-                ],
-                "contacts": {
-                    "phone": perf.phone,
-                    "email": perf.email,
-                },
-            }
-            performer_entries.append(entry)
 
+        performers = performers_by_key[work_name.lower()]
+
+        performer_entries = [
+            PerformerEntry(
+                perf.name,
+                perf.site,
+                perf.rating,
+                price_min,
+                price_max,
+                unit,
+                currency,
+                perf.phone,
+                perf.email,
+            )
+            for perf in performers
+        ]
         if performer_entries:
-            performers_by_task[work_name] = performer_entries
+            entries_by_task[work_name] = performer_entries
 
-    if performers_by_task:
-        ma["performers_by_task"] = performers_by_task
+    # в dict для JSON превращаем одним проходом в самом конце
+    if entries_by_task:
+        ma["performers_by_task"] = {
+            work_name: [_performer_to_dict(p) for p in entries]
+            for work_name, entries in entries_by_task.items()
+        }
 
     ma["city"] = city or ""
     ma["search_engine"] = "Tender Search Engine"
@@ -1022,129 +1450,208 @@ def _apply_market_analysis(tender: Dict[str, Any], city: Optional[str]) -> None:
 # ---------------------------
 # ОСНОВНАЯ ФУНКЦИЯ АНАЛИЗА ТЕКСТА
 # ---------------------------
-def analyze_text(
+def _build_tender_data(
     text: str,
     user_city: Optional[str] = None,
     use_llm: bool = False,
-) -> str:
+) -> Dict[str, Any]:
     """
-    Универсальный анализ текста тендерной документации.
+    Универсальный анализ текста тендерной документации (результат — словарь).
 
     Главное правило: если LLM доступен и смог вернуть валидный JSON,
     ИМЕННО ЕГО результат используется как основа для всех полей (включая шапку).
     Fallback-парсер используется только как запасной источник данных.
     """
     if not text:
-        tender_data = _deep_copy_schema()
-        return json.dumps(tender_data, ensure_ascii=False, indent=2)
+        return _deep_copy_schema()
 
     # 1) Базовый разбор без ИИ (fallback-парсер) — как резерв
-    fallback_data = _fallback_parse(text)
+    fallback_data = _fallback_parse_cached(text)
 
     # --- ограничиваем использование LLM для очень длинных текстов ---
     MAX_LLM_TEXT = 60_000  # символов
-    if use_llm and len(text or "") > MAX_LLM_TEXT:
+    text_len = len(text)
+    if use_llm and text_len > MAX_LLM_TEXT:
         logger.info(
             "Текст длиной %d символов превышает лимит %d, отключаем LLM для ускорения.",
-            len(text or ""),
+            text_len,
             MAX_LLM_TEXT,
         )
         use_llm = False
 
     # 2) Если LLM отключен — работаем только на fallback
     if not use_llm:
-        tender_data = _normalize_to_schema(fallback_data)
-        tender_data = _postprocess_fields(tender_data, fallback_data)
+        tender_data = _normalize_and_merge(fallback_data, fallback_data)
         tender_data.setdefault("analysis_meta", {})
         tender_data["analysis_meta"]["user_city"] = user_city or ""
         _apply_market_analysis(tender_data, user_city)
-        return json.dumps(tender_data, ensure_ascii=False, indent=2)
+        return tender_data
 
     # 3) Подключаем LLM
     provider = get_llm_provider(enable=True)
     if provider is None:
         logger.warning("LLM недоступен, остаёмся на fallback-анализе.")
-        tender_data = _normalize_to_schema(fallback_data)
-        tender_data = _postprocess_fields(tender_data, fallback_data)
+        tender_data = _normalize_and_merge(fallback_data, fallback_data)
         tender_data.setdefault("analysis_meta", {})
         tender_data["analysis_meta"]["user_city"] = user_city or ""
         _apply_market_analysis(tender_data, user_city)
-        return json.dumps(tender_data, ensure_ascii=False, indent=2)
+        return tender_data
 
     # 4) Готовим текст для LLM
     LLM_TEXT_LIMIT = 60_000
-    llm_text = (text or "")[:LLM_TEXT_LIMIT]
+    llm_text = text if text_len <= LLM_TEXT_LIMIT else text[:LLM_TEXT_LIMIT]
 
-    chunks = _split_text(llm_text)
-    total_chunks = len(chunks)
+    total_chunks = _count_chunks(llm_text)
     logger.info(
         "Запуск анализа. Чанков: %d. use_llm=%s, len(text)=%d, len(llm_text)=%d",
         total_chunks,
         use_llm,
-        len(text or ""),
+        text_len,
         len(llm_text),
     )
 
-    partial_results: List[Dict[str, Any]] = []
-    for idx, chunk_text in enumerate(chunks, start=1):
-        dct = _call_llm_chunk(
-            provider=provider,
-            chunk_text=chunk_text,
-            user_city=user_city,
-            chunk_index=idx,
-            total_chunks=total_chunks,
-        )
-        if dct:
-            partial_results.append(dct)
+    # Один чанк — обычный синхронный вызов; несколько — параллельно,
+    # затем сливаем ответы в порядке чанков. Внутри уже работающего event loop
+    # asyncio.run запрещён — там идём по чанкам последовательно.
+    sequential = total_chunks <= 1
+    if not sequential and _event_loop_running():
+        logger.info("Вызов из работающего event loop: чанки обрабатываются последовательно.")
+        sequential = True
+    if sequential:
+        chunk_results = [
+            _call_llm_chunk(provider, chunk_text, user_city, idx, total_chunks)
+            for idx, chunk_text in enumerate(_split_text(llm_text), start=1)
+        ]
+    else:
+        chunk_results = asyncio.run(_call_llm_chunks_async(provider, llm_text, user_city, total_chunks))
+    llm_agg = _fold_tender_dicts(chunk_results)
 
     # 5) Если LLM смог вернуть хотя бы один JSON — используем его как ОСНОВУ
-    if partial_results:
-        llm_agg = _aggregate_tender_dicts(partial_results)
-        tender_data = _normalize_to_schema(llm_agg)
-    else:
+    # 6) Нормализация и зачистка полей за один проход (LLM-first, fallback-only-if-empty)
+    if llm_agg is None:
         logger.warning("LLM не вернул ни одного валидного JSON, используем только fallback.")
-        tender_data = _normalize_to_schema(fallback_data)
-
-    # 6) Финальная зачистка полей (LLM-first, fallback-only-if-empty)
-    tender_data = _postprocess_fields(tender_data, fallback_data)
+        llm_agg = fallback_data
+    tender_data = _normalize_and_merge(llm_agg, fallback_data)
     tender_data.setdefault("analysis_meta", {})
     tender_data["analysis_meta"]["user_city"] = user_city or ""
 
     # 7) Расчёт цен (market_analysis)
     _apply_market_analysis(tender_data, user_city)
 
-    return json.dumps(tender_data, ensure_ascii=False, indent=2)
+    return tender_data
+
+
+def analyze_text(
+    text: str,
+    user_city: Optional[str] = None,
+    use_llm: bool = False,
+) -> str:
+    """Анализ текста тендерной документации; результат — JSON-строка по UNIFIED_TENDER_SCHEMA."""
+    return _dumps(_build_tender_data(text, user_city=user_city, use_llm=use_llm))
+
+
+def analyze_text_to_file(
+    text: str,
+    path: "os.PathLike[str] | str",
+    user_city: Optional[str] = None,
+    use_llm: bool = False,
+) -> None:
+    """
+    То же, что analyze_text, но JSON сразу пишется в файл байтами —
+    без промежуточной строки и повторного кодирования в UTF-8.
+    """
+    data = _build_tender_data(text, user_city=user_city, use_llm=use_llm)
+    with open(path, "wb") as f:
+        f.write(_dumps_bytes(data))
 
 
 # ---------------------------
 # ОБЪЕДИНЕНИЕ НЕСКОЛЬКИХ JSON
 # ---------------------------
-def summarize_jsons(jsons: List[str]) -> str:
-    """
-    Объединяет несколько JSON-строк в один JSON по унифицированной схеме.
-    Используется в app.py после анализа каждого файла.
-    """
-    tender_dicts: List[Dict[str, Any]] = []
+def _iter_tender_dicts(jsons: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Разбирает JSON-строки по одной и отдаёт словари из них (и из списков словарей)."""
     for s in jsons:
         if not s:
             continue
         try:
-            obj = json.loads(s)
+            obj = _loads(s)
         except Exception:
             obj = parse_json_from_text(s)
 
         if isinstance(obj, dict):
-            tender_dicts.append(obj)
+            yield obj
         elif isinstance(obj, list):
-            tender_dicts.extend([x for x in obj if isinstance(x, dict)])
+            yield from (x for x in obj if isinstance(x, dict))
+
 
-    agg = _aggregate_tender_dicts(tender_dicts)
-    return json.dumps(agg, ensure_ascii=False, indent=2)
+def summarize_jsons_bytes(jsons: Iterable[str]) -> bytes:
+    """
+    Объединяет несколько JSON-строк в один JSON по унифицированной схеме
+    и возвращает его в UTF-8 — готовым к записи в файл.
+    Используется в app.py после анализа каждого файла.
+    """
+    # словари сливаются по мере разбора, без промежуточного списка
+    agg = _aggregate_tender_dicts(_iter_tender_dicts(jsons))
+    return _dumps_bytes(agg)
+
+
+def summarize_jsons(jsons: List[str]) -> str:
+    """
+    Объединяет несколько JSON-строк в один JSON по унифицированной схеме.
+    """
+    return summarize_jsons_bytes(jsons).decode("utf-8")
 
 
 # ---------------------------
 # ЧАТ С МОДЕЛЬЮ ПО aggregated_tender.json
 # ---------------------------
+# Контекст чата по файлу отчёта: ((mtime_ns, size), текст сообщения).
+# Пока файл не менялся, повторные вопросы не перечитывают его.
+_chat_context: Optional[Tuple[Tuple[int, int], str]] = None
+_chat_context_lock = threading.Lock()
+
+
+def _read_text_mmap(path: "os.PathLike[str]") -> str:
+    """
+    Читает UTF-8 файл через mmap: текст декодируется прямо из отображения,
+    без промежуточной копии байтов в памяти процесса.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, "utf-8")
+
+
+def _load_chat_context(json_path: "os.PathLike[str]") -> str:
+    """
+    Сообщение с контекстом для чата.
+    Кэшируется по (mtime, размер) файла — перечитываем только после нового анализа.
+    """
+    global _chat_context
+    st = os.stat(json_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _chat_context_lock:
+        cached = _chat_context
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    # JSON в файле уже сериализован — отдаём его модели как есть,
+    # без повторной сериализации на каждый вопрос. Разбираем один раз на
+    # (mtime, размер) только для проверки: битый или недописанный файл
+    # не должен уйти в LLM как контекст (ошибку покажет chat_with_model).
+    tender_json = _read_text_mmap(json_path)
+    _loads(tender_json)
+    context_msg = (
+        "Ниже приведён JSON с результатами анализа тендера. "
+        "Используй его для ответа на мой вопрос.\n\n"
+        f"{tender_json}"
+    )
+    with _chat_context_lock:
+        _chat_context = (stamp, context_msg)
+    return context_msg
+
+
 def chat_with_model(user_message: str) -> str:
     """
     Чат по уже сохранённому temp/aggregated_tender.json.
@@ -1160,8 +1667,7 @@ def chat_with_model(user_message: str) -> str:
         )
 
     try:
-        with json_path.open("r", encoding="utf-8") as f:
-            tender_data = json.load(f)
+        context_msg = _load_chat_context(json_path)
     except Exception as e:
         logger.exception("Не удалось прочитать aggregated_tender.json: %s", e)
         return (
@@ -1183,21 +1689,14 @@ def chat_with_model(user_message: str) -> str:
         "с результатами анализа тендера. Если данных не хватает — честно говори об этом."
     )
 
-    context_msg = (
-        "Ниже приведён JSON с результатами анализа тендера. "
-        "Используй его для ответа на мой вопрос.\n\n"
-        f"{json.dumps(tender_data, ensure_ascii=False, indent=2)}"
-    )
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": context_msg},
+        {"role": "user", "content": user_message},
+    ]
 
     try:
-        resp = provider.generate(
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": context_msg},
-                {"role": "user", "content": user_message},
-            ],
-            model=MODEL_NAME,
-        )
+        resp = provider.generate(messages=messages, model=MODEL_NAME, temperature=CHAT_TEMPERATURE)
         answer = resp["choices"][0]["message"]["content"]
         return answer
     except Exception as e:  # pragma: no cover
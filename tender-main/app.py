@@ -1,63 +1,169 @@
+import functools
+import json
 import os
 import sys
 import logging
+import logging.handlers
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import json
-import generate_report
-import json
-from search_services import SearchService
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.dirname(__file__)))
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'mindsearch')))
 
-import generate_report
 import customtkinter as ctk
 
-from search_services import SearchService  # Импортируйте SearchService
-import os
-import logging
-
-from dotenv import load_dotenv   # <- обязательно
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
 
 # === ВАЖНО: грузим .env ДО всех локальных импортов ===
+# Один раз и по явному пути: повторный load_dotenv() с автопоиском
+# заново разбирал бы тот же файл.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(BASE_DIR, ".env")
-load_dotenv(env_path)
+if load_dotenv is not None:
+    load_dotenv(env_path)
+else:
+    print(
+        "Модуль python-dotenv не установлен. "
+        "Переменные окружения будут взяты из системы."
+    )
 
 # (опционально, чтобы убедиться)
 if not os.getenv("OPENROUTER_API_KEY"):
     print("!!! OPENROUTER_API_KEY не найден в .env")
 else:
     print("OPENROUTER_API_KEY загружен")
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    print(
-        "Модуль python-dotenv не установлен. "
-        "Переменные окружения будут взяты из системы."
-    )
 
 # --- импорт локальных модулей ---
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# каталог приложения и mindsearch (если он есть) — в начало sys.path, один раз
+sys.path[:0] = [
+    p
+    for p in (BASE_DIR, os.path.join(BASE_DIR, "mindsearch"))
+    if p not in sys.path and os.path.isdir(p)
+]
+
+from search_services import SearchService
 
+# generate_report (reportlab) импортируется лениво — в save_report
 try:
     import read_services
     import ai_services
-    import generate_report
 except ImportError as e:
     print(f"Ошибка импорта модулей: {e}")
     import types
     read_services = types.ModuleType("read_services")
     ai_services = types.ModuleType("ai_services")
-    generate_report = types.ModuleType("generate_report")
+
+# Расширение файла -> функция чтения из read_services (строится один раз;
+# getattr — на случай, если read_services не импортировался и это заглушка)
+_READERS = {
+    ext: reader
+    for ext, reader in (
+        (".pdf", getattr(read_services, "read_pdf", None)),
+        (".docx", getattr(read_services, "read_docx", None)),
+        (".doc", getattr(read_services, "read_doc", None)),
+        (".xlsx", getattr(read_services, "read_xlsx", None)),
+        (".xls", getattr(read_services, "read_xls", None)),
+        (".pptx", getattr(read_services, "read_pptx", None)),
+        (".html", getattr(read_services, "read_html", None)),
+        (".htm", getattr(read_services, "read_html", None)),
+        (".xml", getattr(read_services, "read_xml", None)),
+        (".csv", getattr(read_services, "read_csv", None)),
+    )
+    if reader is not None
+}
+
+# Период вывода накопленных строк в GUI-лог (мс)
+LOG_FLUSH_MS = 100
+# Сколько файлов тендера анализировать одновременно
+FILE_WORKERS = 8
+# Минимальный интервал между обновлениями прогресс-бара из worker'а (сек.)
+PROGRESS_MIN_INTERVAL = 0.05
+
+
+@functools.lru_cache(maxsize=1)
+def _load_cities_cached(path: str, mtime: float) -> tuple[str, ...]:
+    """
+    Разбор cities.txt; кэшируется по (путь, mtime) — файл перечитывается
+    только если изменился. Между запусками готовый список лежит рядом
+    в .cities.json: если он не старше cities.txt, разбор не нужен вовсе.
+    (JSON, а не pickle: файл в каталоге данных, и pickle.load из него
+    выполнил бы произвольный код.)
+    """
+    cache_path = os.path.join(os.path.dirname(path), ".cities.json")
+    try:
+        if os.stat(cache_path).st_mtime >= mtime:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cities = json.load(f)
+            if isinstance(cities, list) and all(isinstance(c, str) for c in cities):
+                print(f"Загружено {len(cities)} городов из кэша cities.txt")
+                return tuple(cities)
+    except Exception:
+        pass  # нет кэша или он битый — разбираем исходник
+
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    cities = sorted({c.strip() for c in content.split(",") if c.strip()})
+    print(f"Загружено {len(cities)} городов из cities.txt")
+
+    try:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(cities, f, ensure_ascii=False)
+    except OSError:
+        pass  # каталог только для чтения — просто без кэша
+    return tuple(cities)
+
+
+def _size_text(size: int) -> str:
+    """Размер файла для списка: B / KB / MB."""
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024*1024):.1f} MB"
+
+
+def _format_file_size(path: str) -> str:
+    """Размер одного файла для списка, "?" — если файл недоступен."""
+    try:
+        return _size_text(os.path.getsize(path))
+    except Exception:
+        return "?"
+
+
+def _format_file_sizes(paths: list[str]) -> dict[str, str]:
+    """
+    Размеры сразу для пачки файлов: один os.scandir на каталог вместо
+    stat на каждый путь (на Windows размер приходит вместе с перечислением,
+    на сетевых дисках это один round-trip на каталог).
+    """
+    by_dir: dict[str, dict[str, str]] = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), {})[os.path.basename(path)] = path
+
+    result: dict[str, str] = {}
+    for parent, names in by_dir.items():
+        try:
+            with os.scandir(parent or ".") as it:
+                for entry in it:
+                    path = names.get(entry.name)
+                    if path is not None and path not in result:
+                        try:
+                            result[path] = _size_text(entry.stat().st_size)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+    # не нашлось при перечислении (другой регистр имени и т.п.) — по одному
+    for path in paths:
+        if path not in result:
+            result[path] = _format_file_size(path)
+    return result
 
 
 class TenderAnalyzerApp(ctk.CTk):
@@ -68,16 +174,23 @@ class TenderAnalyzerApp(ctk.CTk):
     def __init__(self):
         super().__init__()
 
-        # Инициализация поискового сервиса
-        self.search_service = SearchService()
-
+        # поисковый сервис создаётся при первом обращении (см. search_service)
+        self._search_service: SearchService | None = None
 
         # состояние
         self.current_files: list[str] = []
+        self._file_size_text: dict[str, str] = {}  # путь -> размер для списка файлов
+        self._file_rows: list[dict] = []  # пул строк-виджетов списка файлов
         self.analysis_in_progress: bool = False
-        self.analyzed_data: str | None = None
+        self.analyzed_data: bytes | None = None
         self.aggregated_json_path: str | None = None
 
+        # буфер строк GUI-лога (см. _gui_only_log)
+        self._log_buf: deque[str] = deque()
+        self._log_flush_scheduled: bool = False
+        # пишут в буфер из любых потоков (GUILogHandler, пул файлов)
+        self._log_lock = threading.Lock()
+
         # логирование
         self._setup_logging()
 
@@ -86,6 +199,7 @@ class TenderAnalyzerApp(ctk.CTk):
 
         # UI
         self._setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self.logger.info("Tender Analyzer запущен")
 
@@ -93,22 +207,27 @@ class TenderAnalyzerApp(ctk.CTk):
     #   СЕРВИСНЫЕ МЕТОДЫ
     # ------------------------------------------------------------------ #
 
+    @property
+    def search_service(self) -> SearchService:
+        """
+        Поисковый сервис — при первом обращении. Берём общий экземпляр
+        ai_services, чтобы кэш цен был один на процесс.
+        """
+        if self._search_service is None:
+            getter = getattr(ai_services, "get_search_service", None)
+            self._search_service = getter() if getter is not None else SearchService()
+        return self._search_service
+
     def _load_cities_from_file(self) -> list[str]:
         """
         Загружает список городов из cities.txt (через запятую).
         Если файла нет или ошибка — возвращает базовый список.
         """
         try:
-            cities_file_path = os.path.join(
-                os.path.dirname(__file__), "cities.txt"
-            )
+            cities_file_path = os.path.join(BASE_DIR, "cities.txt")
             if os.path.exists(cities_file_path):
-                with open(cities_file_path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                cities = [c.strip() for c in content.split(",") if c.strip()]
-                cities = sorted(list(set(cities)))
-                print(f"Загружено {len(cities)} городов из cities.txt")
-                return cities
+                mtime = os.stat(cities_file_path).st_mtime
+                return list(_load_cities_cached(cities_file_path, mtime))
             else:
                 print(
                     "Файл cities.txt не найден, используется базовый список городов"
@@ -137,15 +256,16 @@ class TenderAnalyzerApp(ctk.CTk):
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         )
 
-        # файл
+        # файл и консоль пишет отдельный поток QueueListener: в потоке,
+        # который логирует (UI или worker анализа), остаётся только
+        # постановка записи в очередь, без ожидания диска/stdout
+        handlers: list[logging.Handler] = []
         try:
-            log_file = os.path.join(
-                os.path.dirname(__file__), "tender_analyzer.log"
-            )
+            log_file = os.path.join(BASE_DIR, "tender_analyzer.log")
             fh = logging.FileHandler(log_file, encoding="utf-8")
             fh.setLevel(logging.DEBUG)
             fh.setFormatter(fmt)
-            self.logger.addHandler(fh)
+            handlers.append(fh)
         except Exception as e:
             print(f"Не удалось создать файл логов: {e}")
 
@@ -153,7 +273,14 @@ class TenderAnalyzerApp(ctk.CTk):
         ch = logging.StreamHandler()
         ch.setLevel(logging.INFO)
         ch.setFormatter(fmt)
-        self.logger.addHandler(ch)
+        handlers.append(ch)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        self._log_listener.start()
 
         # обработчик для GUI – добавлю позже, когда появится log_box
         self.gui_handler: logging.Handler | None = None
@@ -180,6 +307,14 @@ class TenderAnalyzerApp(ctk.CTk):
 
         sys.excepthook = handle_exception
 
+    def _on_close(self):
+        """Закрытие окна: дописываем очередь логов и останавливаем её поток."""
+        try:
+            self._log_listener.stop()
+        except Exception:
+            pass
+        self.destroy()
+
     # ---------------------------------- GUI логирование ---------------------------------- #
 
     def _setup_gui_logging(self):
@@ -200,13 +335,8 @@ class TenderAnalyzerApp(ctk.CTk):
                     # избегаем рекурсии (сообщения, пришедшие из GUI)
                     if hasattr(record, "from_gui") and record.from_gui:
                         return
-                    msg = self.format(record)
-                    # чуть чистим формат — убираем timestamp/логгер
-                    if " - " in msg:
-                        parts = msg.split(" - ", 2)
-                        if len(parts) >= 3:
-                            msg = parts[2]
-                    self.gui_log_method(msg)
+                    # формат (уровень + сообщение) задан у самого обработчика
+                    self.gui_log_method(self.format(record))
                 except Exception:
                     pass
 
@@ -221,10 +351,10 @@ class TenderAnalyzerApp(ctk.CTk):
         """
         ts = datetime.now().strftime("%H:%M:%S")
         gui_line = f"[{ts}] {message}"
-        self._gui_only_log(gui_line)
+        lvl = level.upper()
+        self._gui_only_log(gui_line, flush=lvl == "ERROR")
 
         try:
-            lvl = level.upper()
             extra = {"from_gui": True}
             if lvl == "ERROR":
                 self.logger.error(message, extra=extra)
@@ -237,16 +367,52 @@ class TenderAnalyzerApp(ctk.CTk):
         except Exception:
             pass
 
-    def _gui_only_log(self, message: str):
-        """Пишем только в текстбокс лога."""
+    def _gui_only_log(self, message: str, flush: bool = False):
+        """
+        Пишем только в текстбокс лога. Строки копятся в буфере и выводятся
+        пачкой раз в LOG_FLUSH_MS — одна перерисовка вместо одной на строку.
+        flush=True (ошибки) выводит буфер сразу.
+        Может вызываться из любого потока: виджет трогает только UI-поток.
+        """
+        flush_now = flush and threading.current_thread() is threading.main_thread()
+        with self._log_lock:
+            self._log_buf.append(message)
+            if not flush_now:
+                if self._log_flush_scheduled:
+                    return
+                self._log_flush_scheduled = True
+
+        if flush_now:
+            self._flush_log()
+            return
+        try:
+            # из фонового потока срочный вывод — ближайшей итерацией цикла Tk
+            self.after(0 if flush else LOG_FLUSH_MS, self._flush_log)
+        except Exception:
+            with self._log_lock:
+                self._log_flush_scheduled = False
+
+    def _flush_log(self):
+        """Выводит накопленные строки лога одной вставкой (только из UI-потока)."""
+        with self._log_lock:
+            self._log_flush_scheduled = False
+            lines = list(self._log_buf)
+            self._log_buf.clear()
+        if not lines:
+            return
         try:
             self.log_box.configure(state="normal")
-            self.log_box.insert("end", message + "\n")
+            self.log_box.insert("end", "\n".join(lines) + "\n")
             self.log_box.configure(state="disabled")
             self.log_box.see("end")
         except Exception:
             pass
 
+    def _emit_log_batch(self, events: list[tuple[str, str]]):
+        """Выводит пачку сообщений (текст, уровень) из фонового потока за один вызов UI."""
+        for message, level in events:
+            self.log_message(message, level)
+
     # ---------------------------------- ПРОГРЕСС ---------------------------------- #
 
     def update_progress(self, value: int, text: str = ""):
@@ -539,68 +705,74 @@ class TenderAnalyzerApp(ctk.CTk):
     # ------------------------------------------------------------------ #
 
     def _refresh_file_list(self):
-        """Перерисовать список файлов слева."""
-        for child in self.file_list_frame.winfo_children():
-            child.destroy()
+        """
+        Перерисовать список файлов слева. Строки-виджеты переиспользуются:
+        меняем текст и команду кнопки, лишние скрываем через pack_forget,
+        новые создаём только когда список вырос.
+        """
+        n = len(self.current_files)
+        for row in self._file_rows[n:]:
+            row["frame"].pack_forget()
 
-        if not self.current_files:
-            self.no_files_label = ctk.CTkLabel(
-                self.file_list_frame,
-                text="Файлы не выбраны",
-                text_color=("gray50", "gray70"),
-            )
+        if not n:
             self.no_files_label.pack(pady=10)
             self.clear_files_button.configure(state="disabled")
             return
 
-        for path in self.current_files:
-            size_text = ""
-            try:
-                size = os.path.getsize(path)
-                if size < 1024:
-                    size_text = f"{size} B"
-                elif size < 1024 * 1024:
-                    size_text = f"{size / 1024:.1f} KB"
-                else:
-                    size_text = f"{size / (1024*1024):.1f} MB"
-            except Exception:
-                size_text = "?"
+        self.no_files_label.pack_forget()
+        for i, path in enumerate(self.current_files):
+            # размер считаем при добавлении файла; перерисовка диск не трогает
+            size_text = self._file_size_text.get(path)
+            if size_text is None:
+                size_text = self._file_size_text[path] = _format_file_size(path)
 
-            self._create_file_widget(path, size_text)
+            if i < len(self._file_rows):
+                row = self._file_rows[i]
+            else:
+                row = self._create_file_widget()
+                self._file_rows.append(row)
+            self._bind_file_row(row, path, size_text)
 
         self.clear_files_button.configure(state="normal")
 
-    def _create_file_widget(self, file_path: str, file_size_text: str):
-        """Один файл в списке с кнопкой удаления."""
+    def _create_file_widget(self) -> dict:
+        """Строка списка файлов (рамка, подпись, кнопка удаления) — без привязки к файлу."""
         frame = ctk.CTkFrame(self.file_list_frame)
-        frame.pack(fill="x", pady=2)
 
-        name = os.path.basename(file_path)
-        label = ctk.CTkLabel(
-            frame,
-            text=f"📄 {name} ({file_size_text})",
-            anchor="w",
-        )
+        label = ctk.CTkLabel(frame, text="", anchor="w")
         label.pack(side="left", fill="x", expand=True, padx=(8, 0), pady=4)
 
-        def remove():
-            if file_path in self.current_files:
-                if messagebox.askyesno(
-                    "Подтверждение",
-                    f"Удалить файл '{name}' из списка?",
-                    icon="question",
-                ):
-                    self.current_files.remove(file_path)
-                    self._refresh_file_list()
-                    self.log_message(f"Файл удалён: {name}")
-
         btn = ctk.CTkButton(
             frame,
             width=70,
             text="Удалить",
-            command=remove,
         )
         btn.pack(side="right", padx=5, pady=4)
+        return {"frame": frame, "label": label, "btn": btn}
+
+    def _bind_file_row(self, row: dict, file_path: str, file_size_text: str):
+        """Показывает в строке списка конкретный файл."""
+        name = os.path.basename(file_path)
+        row["label"].configure(text=f"📄 {name} ({file_size_text})")
+        row["btn"].configure(command=lambda: self._remove_file(file_path))
+        # скрытые и только что созданные строки добавляем в конец списка;
+        # видимые остаются на своих местах
+        if not row["frame"].winfo_manager():
+            row["frame"].pack(fill="x", pady=2)
+
+    def _remove_file(self, file_path: str):
+        """Удаление одного файла из списка (кнопка в строке)."""
+        if file_path in self.current_files:
+            name = os.path.basename(file_path)
+            if messagebox.askyesno(
+                "Подтверждение",
+                f"Удалить файл '{name}' из списка?",
+                icon="question",
+            ):
+                self.current_files.remove(file_path)
+                self._file_size_text.pop(file_path, None)
+                self._refresh_file_list()
+                self.log_message(f"Файл удалён: {name}")
 
     def select_files(self):
         """Добавление файлов в список."""
@@ -628,11 +800,10 @@ class TenderAnalyzerApp(ctk.CTk):
             self.log_message("Файлы не были выбраны")
             return
 
-        added = 0
-        for path in files:
-            if path not in self.current_files:
-                self.current_files.append(path)
-                added += 1
+        new_files = [p for p in dict.fromkeys(files) if p not in self.current_files]
+        self.current_files.extend(new_files)
+        self._file_size_text.update(_format_file_sizes(new_files))
+        added = len(new_files)
 
         self._refresh_file_list()
         self.log_message(
@@ -648,38 +819,29 @@ class TenderAnalyzerApp(ctk.CTk):
             icon="question",
         ):
             self.current_files = []
+            self._file_size_text.clear()
             self._refresh_file_list()
             self.log_message("Все файлы удалены из списка")
 
-    def read_file_content(self, file_path: str) -> str | None:
+    def read_file_content(self, file_path: str, log=None) -> str | None:
+        """
+        Читает файл подходящим ридером.
+        :param log: куда писать сообщения (message, level); из фоновых потоков
+            передавайте свой колбэк — log_message трогает Tk и годится только
+            для UI-потока.
+        """
+        if log is None:
+            log = self.log_message
         try:
             ext = os.path.splitext(file_path)[1].lower()
+            reader = _READERS.get(ext)
+            if reader is not None:
+                return reader(file_path)
 
-            if ext == ".pdf":
-                return read_services.read_pdf(file_path)
-            if ext == ".docx":
-                return read_services.read_docx(file_path)
-            if ext == ".doc":
-                return read_services.read_doc(file_path)
-
-            if ext == ".xlsx":
-                return read_services.read_xlsx(file_path)
-            if ext == ".xls":
-                return read_services.read_xls(file_path)
-
-            if ext == ".pptx":
-                return read_services.read_pptx(file_path)
-            if ext in (".html", ".htm"):
-                return read_services.read_html(file_path)
-            if ext == ".xml":
-                return read_services.read_xml(file_path)
-            if ext == ".csv":
-                return read_services.read_csv(file_path)
-
-            self.log_message(f"Неизвестный формат файла: {ext}", "WARNING")
+            log(f"Неизвестный формат файла: {ext}", "WARNING")
             return None
         except Exception as e:
-            self.log_message(f"Ошибка при чтении файла {file_path}: {e}", "ERROR")
+            log(f"Ошибка при чтении файла {file_path}: {e}", "ERROR")
             return None
 
     # ------------------------------------------------------------------ #
@@ -732,7 +894,8 @@ class TenderAnalyzerApp(ctk.CTk):
 
             start_ts = time.time()
             analyzed_jsons: list[str] = []
-            total_files = len(self.current_files)
+            files = list(self.current_files)
+            total_files = len(files)
 
             try:
                 # --- проход по всем выбранным файлам ---
@@ -741,55 +904,51 @@ class TenderAnalyzerApp(ctk.CTk):
                     f"📁 Начинаем обработку {total_files} файлов…",
                 )
 
-                for idx, path in enumerate(self.current_files, start=1):
+                # Файлы независимы (чтение с диска, запросы к LLM) —
+                # обрабатываем их параллельно; результаты кладём по индексу,
+                # чтобы порядок файлов в агрегате не зависел от порядка завершения
+                def process_one(idx: int, path: str) -> str | None:
+                    # сообщения по файлу копим и отдаём в UI одной пачкой,
+                    # а не отдельным событием Tk на каждую строку
+                    events: list[tuple[str, str]] = []
+
+                    def log(message: str, level: str = "INFO"):
+                        events.append((message, level))
+
+                    try:
+                        return analyze_one(idx, path, log)
+                    finally:
+                        self.post_ui(self._emit_log_batch, events)
+
+                def analyze_one(idx: int, path: str, log) -> str | None:
                     filename = os.path.basename(path)
 
-                    # прогресс
-                    self.post_ui(
-                        self.update_progress,
-                        int(10 + 60 * (idx / max(total_files, 1))),
-                        f"Анализ файла {idx} из {total_files}: {filename}",
-                    )
-                    self.post_ui(
-                        self.log_message,
-                        f"📄 [{idx}/{total_files}] Чтение файла {filename}",
-                    )
+                    log(f"📄 [{idx}/{total_files}] Чтение файла {filename}")
 
                     # чтение файла
                     try:
-                        content = self.read_file_content(path)
+                        content = self.read_file_content(path, log)
                     except Exception as e:
-                        self.post_ui(
-                            self.log_message,
+                        log(
                             f"❌ Ошибка чтения файла {filename}: {e}",
                             "ERROR",
                         )
-                        continue
+                        return None
 
                     if not content:
-                        self.post_ui(
-                            self.log_message,
+                        log(
                             f"⚠️ Файл {filename} не содержит текста после обработки.",
                             "WARNING",
                         )
-                        continue
+                        return None
 
-                    self.post_ui(
-                        self.log_message,
-                        f"✅ Файл прочитан, длина: {len(content):,} символов",
-                    )
+                    log(f"✅ Файл прочитан, длина: {len(content):,} символов")
 
                     # логика режима
                     if use_ai:
-                        self.post_ui(
-                            self.log_message,
-                            "🤖 Отправляем текст в LLM…",
-                        )
+                        log("🤖 Отправляем текст в LLM…")
                     else:
-                        self.post_ui(
-                            self.log_message,
-                            "🧮 Запуск локального анализа без AI…",
-                        )
+                        log("🧮 Запуск локального анализа без AI…")
 
                     # --- анализ текста ---
                     try:
@@ -799,8 +958,7 @@ class TenderAnalyzerApp(ctk.CTk):
                             use_llm=use_ai,
                         )
                     except Exception as e:
-                        self.post_ui(
-                            self.log_message,
+                        log(
                             f"❌ Ошибка анализа файла {filename}: {e}",
                             "ERROR",
                         )
@@ -809,34 +967,62 @@ class TenderAnalyzerApp(ctk.CTk):
                     # если ИИ/локальный анализ ничего не дал
                     if not analyzed_json or analyzed_json.strip() in ("{}", "[]"):
                         if use_ai:
-                            self.post_ui(
-                                self.log_message,
+                            log(
                                 f"⚠️ AI не вернул структурированных данных для файла {filename}.",
                                 "WARNING",
                             )
                         else:
-                            self.post_ui(
-                                self.log_message,
+                            log(
                                 f"⚠️ Локальный анализ не нашёл структурированных данных в файле {filename}.",
                                 "WARNING",
                             )
-                        continue
+                        return None
+
+                    log(f"✅ Анализ файла {filename} завершен")
+                    return analyzed_json
+
+                results: list[str | None] = [None] * total_files
+                done = 0
+                last_progress_ts = 0.0
+                with ThreadPoolExecutor(max_workers=min(FILE_WORKERS, max(total_files, 1))) as pool:
+                    futures = {
+                        pool.submit(process_one, idx, path): idx
+                        for idx, path in enumerate(files, start=1)
+                    }
+                    for fut in as_completed(futures):
+                        idx = futures[fut]
+                        try:
+                            results[idx - 1] = fut.result()
+                        except Exception as e:
+                            self.post_ui(
+                                self.log_message,
+                                f"❌ Ошибка обработки файла "
+                                f"{os.path.basename(files[idx - 1])}: {e}",
+                                "ERROR",
+                            )
+                        done += 1
+                        # прогресс — не чаще раза в PROGRESS_MIN_INTERVAL,
+                        # последний файл — всегда
+                        now = time.monotonic()
+                        if done == total_files or now - last_progress_ts >= PROGRESS_MIN_INTERVAL:
+                            last_progress_ts = now
+                            self.post_ui(
+                                self.update_progress,
+                                int(10 + 60 * (done / max(total_files, 1))),
+                                f"Обработано файлов: {done} из {total_files}",
+                            )
 
-                    analyzed_jsons.append(analyzed_json)
-                    self.post_ui(
-                        self.log_message,
-                        f"✅ Анализ файла {filename} завершен",
-                    )
+                analyzed_jsons = [r for r in results if r]
 
                 # --- агрегация результатов по всем файлам ---
+                aggregated: bytes | None = None
                 if not analyzed_jsons:
                     self.post_ui(
                         self.log_message,
                         "⚠️ Не удалось получить структурированные данные ни по одному файлу. "
-                        "Будет сформирован пустой отчёт.",
+                        "Отчёт не сформирован.",
                         "WARNING",
                     )
-                    aggregated = json.dumps({}, ensure_ascii=False, indent=2)
                 else:
                     self.post_ui(
                         self.update_progress,
@@ -848,14 +1034,27 @@ class TenderAnalyzerApp(ctk.CTk):
                         f"🔄 Объединяем результаты {len(analyzed_jsons)} файлов…",
                     )
                     try:
-                        aggregated = ai_services.summarize_jsons(analyzed_jsons)
+                        aggregated = ai_services.summarize_jsons_bytes(analyzed_jsons)
                     except Exception as e:
                         self.post_ui(
                             self.log_message,
                             f"❌ Ошибка агрегации JSON: {e}",
                             "ERROR",
                         )
-                        aggregated = json.dumps({}, ensure_ascii=False, indent=2)
+
+                # Нечего сохранять — не пишем пустой JSON на диск и не даём
+                # открыть отчёт/чат по нему (или по файлу прошлого анализа)
+                if aggregated is None:
+                    self.aggregated_json_path = None
+                    self.analyzed_data = None
+                    self.post_ui(
+                        self.update_progress,
+                        100,
+                        "Анализ завершён: данных для отчёта нет",
+                    )
+                    self.post_ui(self.save_report_button.configure, state="disabled")
+                    self.post_ui(self.open_chat_button.configure, state="disabled")
+                    return
 
                 # --- сохраняем агрегированный JSON, чтобы потом делать PDF/чат ---
                 temp_dir = os.path.join(os.getcwd(), "temp")
@@ -863,8 +1062,17 @@ class TenderAnalyzerApp(ctk.CTk):
                 aggregated_path = os.path.join(temp_dir, "aggregated_tender.json")
 
                 try:
-                    with open(aggregated_path, "w", encoding="utf-8") as f:
+                    # JSON уже в UTF-8 — пишем байты без текстового слоя; через
+                    # временный файл, чтобы чат/отчёт никогда не увидели
+                    # недописанный JSON. Буферизованный write дописывает всё
+                    # (сырой FileIO может записать только часть), fsync — чтобы
+                    # после replace на диске был полный файл
+                    tmp_path = aggregated_path + ".tmp"
+                    with open(tmp_path, "wb") as f:
                         f.write(aggregated)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, aggregated_path)
                 except Exception as e:
                     self.post_ui(
                         self.log_message,
@@ -950,6 +1158,8 @@ class TenderAnalyzerApp(ctk.CTk):
 
         try:
             self.log_message("Генерируем PDF-отчёт…")
+            import generate_report
+
             generate_report.generate_pdf_report(
                 self.aggregated_json_path, out_path
             )
@@ -983,11 +1193,14 @@ class TenderAnalyzerApp(ctk.CTk):
     # ------------------------------------------------------------------ #
 
     def clear_log(self):
+        with self._log_lock:
+            self._log_buf.clear()
         self.log_box.configure(state="normal")
         self.log_box.delete("1.0", "end")
         self.log_box.configure(state="disabled")
 
     def export_log(self):
+        self._flush_log()
         content = self.log_box.get("1.0", "end-1c")
         if not content.strip():
             messagebox.showinfo("Пустой лог", "Лог пуст, экспортировать нечего.")
@@ -1,5 +1,7 @@
+import hashlib
 import os
-from typing import List
+import re
+from typing import Dict, List
 
 from registry import ProviderRegistry
 from tender_core.models import DocumentMeta
@@ -16,9 +18,25 @@ from read_services import (
 )
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
-_llm = ProviderRegistry.get_provider()
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _get_llm():
+    """
+    Провайдер LLM берём лениво, в момент вызова, а не при импорте модуля:
+    процессы-читатели импортируют модуль заново, и им LLM не нужен, а без
+    OPENROUTER_API_KEY импорт бы падал.
+    """
+    return ProviderRegistry.get_provider()
+
 
 def convert_doc_to_docx(path):
     out_dir = tempfile.mkdtemp()
@@ -29,6 +47,32 @@ def convert_doc_to_docx(path):
     new_file = os.path.join(out_dir, basename(path).replace(".doc", ".docx"))
     return new_file
 
+class _GarbageTable(dict):
+    """
+    Таблица для str.translate: непечатаемые символы (кроме пробельных) -> None.
+    Заполняется лениво по встреченным кодам, поэтому проход по тексту
+    идёт целиком в C, без Python-вызова на каждый символ.
+    """
+
+    def __missing__(self, code: int):
+        ch = chr(code)
+        # Оставляем буквы/цифры/знаки препинания/пробелы/переносы строк
+        value = code if ch.isprintable() or ch.isspace() else None
+        self[code] = value
+        return value
+
+
+_DROP_GARBAGE = _GarbageTable()
+# заранее заполняем ASCII, Latin-1 и кириллицу: каждый процесс-читатель
+# стартует с готовой таблицей, и __missing__ срабатывает только на экзотике
+for _code in range(0x500):
+    _DROP_GARBAGE[_code]
+del _code
+
+# размер одного окна выборки для детектора мусора (4 окна ≈ 64K символов)
+_GARBAGE_WINDOW = 16_000
+
+
 def _looks_like_binary_garbage(text: str) -> bool:
     """
     Простейший детектор "кракозябр":
@@ -36,24 +80,28 @@ def _looks_like_binary_garbage(text: str) -> bool:
     """
     if not text:
         return False
-    bad = 0
-    total = 0
-    for ch in text:
-        total += 1
-        # Оставляем буквы/цифры/знаки препинания/пробелы/переносы строк
-        if ch.isprintable() or ch.isspace():
-            continue
-        bad += 1
+    n = len(text)
+    if n > 4 * _GARBAGE_WINDOW:
+        # решение одно и то же по всему тексту и по выборке — смотрим
+        # начало, конец и два окна из середины, а не весь многомегабайтный текст
+        w = _GARBAGE_WINDOW
+        text = (
+            text[:w]
+            + text[n // 3:n // 3 + w]
+            + text[2 * n // 3:2 * n // 3 + w]
+            + text[-w:]
+        )
+    total = len(text)
+    bad = total - len(text.translate(_DROP_GARBAGE))
     # если больше 10% символов — мусор, считаем текст невалидным
-    return (bad / max(total, 1)) > 0.10
+    return (bad / total) > 0.10
 
 
 def _clean_text(text: str) -> str:
     """Мягкая очистка текста от мусора и скрытых символов."""
     if not text:
         return ""
-    cleaned = "".join(ch for ch in text if ch.isprintable() or ch.isspace())
-    return cleaned.strip()
+    return text.translate(_DROP_GARBAGE).strip()
 
 def _convert_doc_to_docx_with_libreoffice(path: str) -> str:
     """
@@ -96,10 +144,152 @@ def _convert_doc_to_docx_with_libreoffice(path: str) -> str:
     return path
 
 
-def _read_any(path: str) -> str:
+# Кэш извлечённого текста между запусками: повторный анализ того же тендера
+# не разбирает PDF/DOCX заново. Ключ — (версия, путь, mtime, размер), так что при
+# изменении файла запись просто перестаёт находиться. Лежит в пользовательском
+# каталоге кэша, а не в общем temp: чужой пользователь не прочитает и не подложит записи.
+_READ_CACHE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA")
+    or os.environ.get("XDG_CACHE_HOME")
+    or os.path.join(os.path.expanduser("~"), ".cache"),
+    "tender_analyzer",
+    "read_cache",
+)
+# Увеличивать при изменении читателей или _clean_text — старые записи перестанут
+# находиться и со временем удалятся по возрасту
+_READ_CACHE_VERSION = 1
+# Записи, к которым не обращались дольше этого срока, удаляем
+_READ_CACHE_MAX_AGE = 30 * 24 * 3600
+
+
+def _read_cache_path(path: str) -> str | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{_READ_CACHE_VERSION}|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    key = hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(_READ_CACHE_DIR, key + ".txt")
+
+
+def _prune_read_cache() -> None:
+    """Удаляет записи кэша текста, к которым давно не обращались."""
+    try:
+        entries = list(os.scandir(_READ_CACHE_DIR))
+    except OSError:
+        return
+    cutoff = time.time() - _READ_CACHE_MAX_AGE
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# Сколько секунд ждать soffice на один файл пачки: зависший LibreOffice
+# (диалог восстановления, занятый профиль) не должен блокировать загрузку
+_SOFFICE_TIMEOUT_PER_FILE = 60
+
+
+def _convert_docs_to_docx_with_libreoffice(paths: List[str], out_dir: str) -> Dict[str, str]:
+    """
+    Конвертирует несколько .doc в .docx одним запуском soffice — LibreOffice
+    принимает список файлов, и его старт (1–2 с) платится один раз на пачку.
+    Результаты пишутся в out_dir: каталогом владеет вызывающий и удаляет его,
+    когда .docx прочитаны.
+    Возвращает {исходный путь: путь к .docx} только для успешно сконвертированных;
+    остальные _read_any_uncached попробует сконвертировать поштучно.
+    """
+    try:
+        from shutil import which
+
+        if not paths or which("soffice") is None:
+            return {}
+
+        # файлы с одинаковыми именами из разных папок перезаписали бы друг друга
+        # в общем outdir — такие оставляем на поштучную конвертацию
+        by_base: Dict[str, str] = {}
+        for p in paths:
+            base = os.path.splitext(os.path.basename(p))[0]
+            by_base.setdefault(base, p)
+
+        subprocess.run(
+            [
+                "soffice",
+                "--headless",
+                "--convert-to",
+                "docx",
+                "--outdir",
+                out_dir,
+                *by_base.values(),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=_SOFFICE_TIMEOUT_PER_FILE * len(by_base),
+        )
+    except Exception as e:
+        print(f"⚠️ Не удалось конвертировать .doc-файлы через LibreOffice: {e}")
+        return {}
+
+    converted: Dict[str, str] = {}
+    for base, p in by_base.items():
+        candidate = os.path.join(out_dir, base + ".docx")
+        if os.path.exists(candidate):
+            converted[p] = candidate
+    return converted
+
+
+def _read_any(path: str, docx_path: str | None = None) -> str:
+    """
+    _read_any_uncached с дисковым кэшем результата.
+    Пустой результат (ошибка чтения/мусор) не кэшируем — вдруг в следующий раз
+    появится LibreOffice или нужная библиотека.
+    """
+    cache_path = _read_cache_path(path)
+    if cache_path is not None:
+        try:
+            with open(cache_path, "r", encoding="utf-8", newline="") as f:
+                content = f.read()
+            # отмечаем обращение — по mtime чистим давно не нужные записи
+            os.utime(cache_path)
+            return content
+        except (OSError, ValueError):
+            # нет записи, либо она битая/чужая (UnicodeDecodeError) — читаем заново
+            pass
+
+    content = _read_any_uncached(path, docx_path)
+
+    if content and cache_path is not None:
+        tmp_path = None
+        try:
+            os.makedirs(_READ_CACHE_DIR, mode=0o700, exist_ok=True)
+            # пишем во временный файл и переименовываем — параллельные
+            # процессы не увидят недописанную запись
+            fd, tmp_path = tempfile.mkstemp(dir=_READ_CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось сохранить кэш для {path}: {e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    return content
+
+
+def _read_any_uncached(path: str, docx_path: str | None = None) -> str:
     """
     Унифицированное чтение документа по расширению.
     НЕ бросает исключений наружу — в случае проблем возвращает пустую строку.
+
+    :param docx_path: Результат конвертации .doc-файла, сделанной заранее в
+        основном процессе (.docx или сам .doc, если конвертация не удалась);
+        если не задан — конвертируем сами.
     """
     ext = os.path.splitext(path)[1].lower()
 
@@ -108,7 +298,7 @@ def _read_any(path: str) -> str:
             content = read_docx(path)
         elif ext == ".doc":
             # Сначала пробуем сконвертировать в .docx через LibreOffice
-            converted = _convert_doc_to_docx_with_libreoffice(path)
+            converted = docx_path or _convert_doc_to_docx_with_libreoffice(path)
             if converted.lower().endswith(".docx") and os.path.exists(converted):
                 content = read_docx(converted)
             else:
@@ -147,6 +337,50 @@ def _read_any(path: str) -> str:
     return content
 
 
+# Ключевые фразы по типам документов; порядок групп = приоритет типа
+_DOC_TYPE_KEYWORDS = (
+    # Техническое задание
+    ("tz", ("техническое задание", "тз ", " тз:", "т.з.")),
+    # Проект контракта / договора
+    ("contract", ("проект контракта", "проект договора", "настоящий контракт", "настоящий договор")),
+    # Смета / локальная смета / ведомость объёмов работ
+    ("estimate", ("смета", "локальная смета", "ведомость объемов", "ведомость объёмов", "калькуляция")),
+    # Инструкции / регламенты
+    ("instruction", ("инструкция", "руководство по эксплуатации", "регламент", "памятка")),
+)
+
+# Одна альтернация с группой на каждый тип: текст проходим один раз,
+# без .lower()-копии и четырёх отдельных поисков
+_CLASSIFY_RE = re.compile(
+    "|".join(
+        "(" + "|".join(re.escape(kw) for kw in keywords) + ")"
+        for _, keywords in _DOC_TYPE_KEYWORDS
+    ),
+    re.IGNORECASE,
+)
+
+# признаки типа документа стоят в начале — дальше первых 200K символов не ищем
+_CLASSIFY_LIMIT = 200_000
+
+
+@lru_cache(maxsize=None)
+def _classify_automaton():
+    """
+    Автомат Ахо–Корасик по всем ключевым фразам (значение — номер типа).
+    Один линейный проход по тексту при любом числе фраз. Строится при первой
+    классификации — процессам-читателям он не нужен.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for priority, (_, keywords) in enumerate(_DOC_TYPE_KEYWORDS):
+        for kw in keywords:
+            automaton.add_word(kw, priority)
+    automaton.make_automaton()
+    return automaton
+
+
+
 def _classify_doc_rule_based(text: str) -> str:
     """
     Простая эвристическая классификация документов:
@@ -155,25 +389,52 @@ def _classify_doc_rule_based(text: str) -> str:
     if not text:
         return "other"
 
-    t = text.lower()
+    # Тип с наивысшим приоритетом среди всех совпадений (как раньше, когда
+    # типы проверялись по очереди); ТЗ выше всех — на нём можно остановиться
+    best = None
+    automaton = _classify_automaton()
+    if automaton is not None:
+        # автомат регистрозависимый, фразы заданы в нижнем регистре
+        for _, priority in automaton.iter(text[:_CLASSIFY_LIMIT].lower()):
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+    else:
+        for m in _CLASSIFY_RE.finditer(text, 0, _CLASSIFY_LIMIT):
+            priority = m.lastindex - 1
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+
+    if best is None:
+        return "other"
+    return _DOC_TYPE_KEYWORDS[best][0]
+
 
-    # Техническое задание
-    if any(kw in t for kw in ["техническое задание", "тз ", " тз:", "т.з."]):
-        return "tz"
+_DOC_TYPES = ("tz", "contract", "estimate", "instruction", "other")
 
-    # Проект контракта / договора
-    if any(kw in t for kw in ["проект контракта", "проект договора", "настоящий контракт", "настоящий договор"]):
-        return "contract"
 
-    # Смета / локальная смета / ведомость объёмов работ
-    if any(kw in t for kw in ["смета", "локальная смета", "ведомость объемов", "ведомость объёмов", "калькуляция"]):
-        return "estimate"
+def _llm_response_text(resp) -> str:
+    """Текст ответа LLM в нижнем регистре (ответ провайдера или уже строка)."""
+    # ожидаем структуру, похожую на OpenAI / OpenRouter
+    if isinstance(resp, dict):
+        choices = resp.get("choices") or []
+        if choices:
+            msg = choices[0].get("message") or {}
+            return (msg.get("content") or "").strip().lower()
+        return ""
+    # на всякий случай, если провайдер вернул уже строку
+    return str(resp).strip().lower()
 
-    # Инструкции / регламенты
-    if any(kw in t for kw in ["инструкция", "руководство по эксплуатации", "регламент", "памятка"]):
-        return "instruction"
 
-    return "other"
+def _doc_type_from_answer(answer: str) -> str | None:
+    """Первый допустимый тип документа, упомянутый в ответе, или None."""
+    for token in _DOC_TYPES:
+        if token in answer:
+            return token
+    return None
 
 
 def _classify_doc_llm(text: str) -> str:
@@ -210,23 +471,10 @@ def _classify_doc_llm(text: str) -> str:
     try:
         # BaseProvider.generate обычно возвращает JSON от API (а не голую строку),
         # поэтому аккуратно достаём текст из первого choice.
-        resp = _llm.generate(messages=[system_msg, user_msg])
-        # ожидаем структуру, похожую на OpenAI / OpenRouter
-        if isinstance(resp, dict):
-            choices = resp.get("choices") or []
-            if choices:
-                msg = choices[0].get("message") or {}
-                content = (msg.get("content") or "").strip().lower()
-            else:
-                content = ""
-        else:
-            # на всякий случай, если провайдер вернул уже строку
-            content = str(resp).strip().lower()
-
-        allowed = {"tz", "contract", "estimate", "instruction", "other"}
-        for token in allowed:
-            if token in content:
-                return token
+        resp = _get_llm().generate(messages=[system_msg, user_msg])
+        token = _doc_type_from_answer(_llm_response_text(resp))
+        if token:
+            return token
 
         # если LLM ничего внятного не сказал — fallback к rule-based
         return _classify_doc_rule_based(text)
@@ -236,6 +484,60 @@ def _classify_doc_llm(text: str) -> str:
         return _classify_doc_rule_based(text)
 
 
+def _classify_docs_llm_batch(texts: List[str]) -> List[str]:
+    """
+    LLM-классификация нескольких документов одним запросом: N фрагментов
+    в одном промпте, в ответ — N строк с типами. Если число строк не совпало
+    или LLM недоступен — каждому документу результат rule-based.
+    """
+    if not texts:
+        return []
+    if len(texts) == 1:
+        return [_classify_doc_llm(texts[0])]
+
+    fallback = [_classify_doc_rule_based(t) for t in texts]
+
+    n = len(texts)
+    parts = [
+        f"---DOC {i}---\n{t[:4000]}" for i, t in enumerate(texts, start=1)
+    ]
+
+    system_msg = {
+        "role": "system",
+        "content": (
+            "Ты помощник для тендерной аналитики. "
+            "По кратким фрагментам текста определи тип каждого документа госзакупки. "
+            "Допустимые ответы (одно слово, латиницей): "
+            "tz, contract, estimate, instruction, other."
+        ),
+    }
+    user_msg = {
+        "role": "user",
+        "content": (
+            f"Ниже {n} фрагментов документов.\n\n"
+            + "\n\n".join(parts)
+            + f"\n\nОтветь ровно {n} строками, по одной на документ в том же порядке: "
+            "tz, contract, estimate, instruction или other."
+        ),
+    }
+
+    try:
+        resp = _get_llm().generate(messages=[system_msg, user_msg])
+        lines = [ln for ln in _llm_response_text(resp).splitlines() if ln.strip()]
+        if len(lines) != n:
+            print(
+                f"⚠️ LLM вернул {len(lines)} строк вместо {n} при классификации — "
+                "использую rule-based."
+            )
+            return fallback
+        return [
+            _doc_type_from_answer(line) or fb for line, fb in zip(lines, fallback)
+        ]
+    except Exception as e:
+        print(f"⚠️ Ошибка LLM при классификации документов: {e}")
+        return fallback
+
+
 def load_and_classify_documents(paths: List[str], use_llm: bool = False) -> List[DocumentMeta]:
     """
     Загружает список файлов, читает их содержимое и присваивает каждому тип:
@@ -244,18 +546,53 @@ def load_and_classify_documents(paths: List[str], use_llm: bool = False) -> List
     Возвращает список DocumentMeta, который дальше идёт в основной пайплайн.
     """
     docs: List[DocumentMeta] = []
-
-    for p in paths:
-        content = _read_any(p)
+    if not paths:
+        return docs
+
+    # Разбор PDF/DOCX — CPU-bound, поэтому читаем файлы в отдельных процессах.
+    # Для 1–2 файлов запуск процессов (spawn на Windows) дороже самого чтения —
+    # там хватает потоков. Классификация дешёвая и идёт в основном процессе.
+    _prune_read_cache()
+
+    # .doc конвертируем заранее одним вызовом soffice (кроме уже закэшированных)
+    doc_paths = [
+        p for p in paths
+        if os.path.splitext(p)[1].lower() == ".doc"
+        and not os.path.exists(_read_cache_path(p) or "")
+    ]
+    # Сконвертированные пачкой .docx нужны только до конца чтения
+    with tempfile.TemporaryDirectory(prefix="tender_docx_", ignore_cleanup_errors=True) as docx_dir:
+        docx_paths = _convert_docs_to_docx_with_libreoffice(doc_paths, docx_dir)
+        # Остальные (совпавшие имена, сбой пакета) — тоже здесь и по очереди:
+        # параллельные soffice на одном профиле отдают задание первому экземпляру
+        # и выходят без результата. В читатели конвертация не попадает.
+        for p in doc_paths:
+            if p not in docx_paths:
+                docx_paths[p] = _convert_doc_to_docx_with_libreoffice(p)
+
+        workers = min(len(paths), os.cpu_count() or 1)
+        executor_cls = ThreadPoolExecutor if len(paths) <= 2 else ProcessPoolExecutor
+        with executor_cls(max_workers=workers) as ex:
+            contents = list(ex.map(_read_any, paths, [docx_paths.get(p) for p in paths]))
+
+    unresolved: List[int] = []
+    for p, content in zip(paths, contents):
         # если файл вообще не прочитался — пропускаем его, чтобы не ломать логику
         if not content:
             print(f"⚠️ Файл {p} не был прочитан или содержит только мусор — пропускаю.")
             continue
 
         doc_type = _classify_doc_rule_based(content)
-        if use_llm:
-            doc_type = _classify_doc_llm(content)
+        # ключевые фразы нашлись — тип однозначен, в LLM ходим только за "other"
+        if use_llm and doc_type == "other":
+            unresolved.append(len(docs))
 
         docs.append(DocumentMeta(path=p, content=content, doc_type=doc_type))
 
+    # все неопознанные документы — одним запросом к LLM, а не по запросу на файл
+    if unresolved:
+        types = _classify_docs_llm_batch([docs[i].content for i in unresolved])
+        for i, doc_type in zip(unresolved, types):
+            docs[i].doc_type = doc_type
+
     return docs
@@ -1,4 +1,5 @@
 import logging
+import mmap
 import os
 import json
 import re
@@ -20,11 +21,38 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.fonts import addMapping
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 print("=== USING CORRECT generate_report.py ===")
 
 logger = logging.getLogger(__name__)
 
 
+def _loads(data):
+    """Разбор JSON: orjson, если установлен, иначе stdlib json."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _load_json_file(path):
+    """
+    Загружает JSON-файл через mmap: парсер читает данные прямо из
+    отображения (page cache), без копии файла в объект bytes.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _loads(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if orjson is not None:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+            return json.loads(str(mm, "utf-8"))
+
+
 def make_multiline_paragraph(lines_html, style):
     """Делает Paragraph с переносами строк (<br/>) из списка HTML-строк."""
     if not lines_html:
@@ -310,12 +338,11 @@ def _build_performers_lines(work_name, performers_data, search_city):
 
 def generate_pdf_report(tender_json_path: str, output_path: str = "tender_report.pdf"):
     # ---------- загрузка JSON ----------
-    with open(tender_json_path, "r", encoding="utf-8") as f:
-        tender_data = json.load(f)
+    tender_data = _load_json_file(tender_json_path)
 
     if isinstance(tender_data, str):
         try:
-            obj = json.loads(tender_data)
+            obj = _loads(tender_data)
             if isinstance(obj, dict):
                 tender_data = obj
             else:
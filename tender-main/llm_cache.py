@@ -0,0 +1,70 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LLMCache:
+    """
+    Простой in-memory LRU-кэш ответов LLM.
+
+    Ключ — sha256 от (model, messages, temperature), значение — полный JSON-ответ
+    провайдера и время записи. Кэшировать имеет смысл только детерминированные
+    запросы (temperature=0), иначе повтор не обязан давать тот же ответ.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600.0):
+        """
+        :param maxsize: Максимальное количество ответов в кэше.
+        :param ttl: Время жизни записи в секундах.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model: str, messages: List[Dict[str, Any]], temperature: float) -> str:
+        raw = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, messages: List[Dict[str, Any]], temperature: float) -> Optional[Dict[str, Any]]:
+        """Возвращает закэшированный ответ или None, если его нет / он протух."""
+        key = self._key(model, messages, temperature)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            resp, ts = item
+            if time.monotonic() - ts > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return resp
+
+    def set(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        resp: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Сохраняет ответ и возвращает его же (удобно для `cache.get(...) or cache.set(...)`)."""
+        key = self._key(model, messages, temperature)
+        with self._lock:
+            self._data[key] = (resp, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return resp
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
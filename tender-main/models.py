@@ -1,3 +1,4 @@
+import sys
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from datetime import date
@@ -10,7 +11,7 @@ class DocumentMeta:
     doc_type: str  # "tz", "contract", "estimate", "instruction", "other"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class WorkItem:
     """Единица работ из ТЗ/сметы."""
     name: str
@@ -19,6 +20,12 @@ class WorkItem:
     volume: float
     raw_row: Optional[str] = None  # исходная строка из документа
 
+    def __post_init__(self):
+        # интернируем имя: одинаковые названия работ — один объект строки,
+        # поиск по словарю цен сравнивает их по ссылке
+        if isinstance(self.name, str):
+            object.__setattr__(self, "name", sys.intern(self.name))
+
 
 @dataclass
 class TimeConditions:
@@ -30,7 +37,7 @@ class TimeConditions:
     other_terms: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TenderObject:
     title: str
     description: str
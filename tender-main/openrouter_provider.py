@@ -1,7 +1,86 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
 import requests
+import httpx
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# HTTP/2 в httpx требует пакет h2 (httpx[http2]); без него работаем по HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _dumps(obj: Any) -> bytes:
+    """Сериализация тела запроса: orjson, если установлен, иначе stdlib json."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _loads(data: bytes | str) -> Any:
+    """Разбор JSON-ответа: orjson, если установлен, иначе stdlib json."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+if msgspec is not None:
+    # Схема ответа /chat/completions: только то, что реально читаем.
+    # Лишние поля ответа msgspec игнорирует.
+    class ChatMessage(msgspec.Struct):
+        content: Union[str, List[Any], None] = None
+
+    class ChatChoice(msgspec.Struct):
+        message: ChatMessage
+
+    class ChatCompletion(msgspec.Struct):
+        choices: List[ChatChoice]
+
+
+def completion_text(resp: Any) -> str:
+    """
+    Текст первого варианта ответа /chat/completions.
+
+    Ответ валидируется по схеме заранее (msgspec, если установлен):
+    при неожиданной структуре — ValueError с понятным текстом,
+    а не KeyError где-то посреди индексации.
+    """
+    content: Optional[Any]
+    if msgspec is not None:
+        try:
+            completion = msgspec.convert(resp, type=ChatCompletion)
+        except msgspec.ValidationError as e:
+            raise ValueError(f"Неожиданный формат ответа LLM: {e}") from e
+        if not completion.choices:
+            raise ValueError("Ответ LLM не содержит choices")
+        content = completion.choices[0].message.content
+    else:
+        try:
+            content = resp["choices"][0]["message"].get("content")
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            raise ValueError(f"Неожиданный формат ответа LLM: {e!r}") from e
+
+    if isinstance(content, list):
+        # Иногда контент приходит списком частей
+        return "".join(
+            part["text"] if isinstance(part, dict) and "text" in part else str(part)
+            for part in content
+            if isinstance(part, (dict, str))
+        )
+    return content or ""
 
 
 class OpenRouterProvider:
@@ -28,8 +107,54 @@ class OpenRouterProvider:
         if not self.api_key:
             raise RuntimeError("OPENROUTER_API_KEY не установлен")
 
+        # Асинхронные клиенты живут по одному на event loop: клиент httpx
+        # нельзя переиспользовать между разными циклами (asyncio.run(...)).
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # Синхронная сессия requests создаётся при первом запросе и
+        # переиспользуется: keep-alive вместо нового TCP/TLS на каждый вызов.
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+
     # ---------- Вспомогательные методы ----------
 
+    def _async_client(self) -> httpx.AsyncClient:
+        """
+        Общий httpx.AsyncClient для текущего event loop:
+        пул соединений и HTTP/2-мультиплексирование вместо нового TCP/TLS на каждый запрос.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=_HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+                timeout=self.timeout,
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _sync_session(self) -> requests.Session:
+        """Общая requests.Session провайдера с пулом соединений."""
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                session = self._session
+                if session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return session
+
+    async def aclose(self) -> None:
+        """Закрывает асинхронный клиент текущего event loop (если он был создан)."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
     def _build_url(self, endpoint: str) -> str:
         """
         Собирает полный URL для запроса.
@@ -59,6 +184,7 @@ class OpenRouterProvider:
         max_tokens: int = 1024,
         temperature: float = 0.7,
         extra_headers: Dict[str, str] | None = None,
+        response_format: Dict[str, Any] | None = None,
         **_: Any,
     ) -> Dict[str, Any]:
         """
@@ -78,19 +204,58 @@ class OpenRouterProvider:
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
+        if response_format:
+            payload["response_format"] = response_format
 
         headers = self._headers()
         if extra_headers:
             headers.update(extra_headers)
 
-        resp = requests.post(
+        resp = self._sync_session().post(
             url,
             headers=headers,
-            json=payload,
+            data=_dumps(payload),
             timeout=self.timeout,
         )
         resp.raise_for_status()
-        return resp.json()
+        return _loads(resp.content)
+
+    async def agenerate(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gpt-4.1",
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_headers: Dict[str, str] | None = None,
+        response_format: Dict[str, Any] | None = None,
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """
+        Асинхронный аналог generate(...) на httpx.AsyncClient.
+
+        Позволяет держать несколько запросов к OpenRouter «в полёте» одновременно
+        (asyncio.gather), не блокируя поток на каждом HTTP round-trip.
+
+        Возвращает полный JSON-ответ OpenRouter в формате /chat/completions.
+        """
+        url = self._build_url("/chat/completions")
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format:
+            payload["response_format"] = response_format
+
+        headers = self._headers()
+        if extra_headers:
+            headers.update(extra_headers)
+
+        resp = await self._async_client().post(url, headers=headers, content=_dumps(payload))
+        resp.raise_for_status()
+        return _loads(resp.content)
 
     def generate_text(
         self,
@@ -126,15 +291,15 @@ class OpenRouterProvider:
             headers.update(extra_headers)
 
         try:
-            resp = requests.post(
+            resp = self._sync_session().post(
                 url,
                 headers=headers,
-                json=payload,
+                data=_dumps(payload),
                 timeout=self.timeout,
             )
 
             resp.raise_for_status()
-            data = resp.json()
+            data = _loads(resp.content)
 
             # Извлекаем текст из первого варианта ответа
             choices = data.get("choices", [])
@@ -191,15 +356,15 @@ class OpenRouterProvider:
         url = self._build_url("/chat/completions")
 
         try:
-            resp = requests.post(
+            resp = self._sync_session().post(
                 url,
                 headers=self._headers(),
-                json=payload,
+                data=_dumps(payload),
                 timeout=self.timeout,
             )
 
             resp.raise_for_status()
-            data = resp.json()
+            data = _loads(resp.content)
             return data
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при запросе: {e}")
@@ -210,6 +375,25 @@ class OpenRouterProvider:
 
     # ---------- Стриминг (потоковый вывод) ----------
 
+    def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gpt-4.1",
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        **_: Any,
+    ):
+        """
+        Потоковый режим под интерфейс MindSearch (BaseProvider.stream).
+        Итератор фрагментов текста по мере генерации — см. chat_stream(...).
+        """
+        return self.chat_stream(
+            messages=messages,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+
     def chat_stream(
         self,
         messages: List[Dict[str, Any]],
@@ -238,10 +422,10 @@ class OpenRouterProvider:
         url = self._build_url("/chat/completions")
 
         try:
-            with requests.post(
+            with self._sync_session().post(
                 url,
                 headers=self._headers(),
-                json=payload,
+                data=_dumps(payload),
                 timeout=self.timeout,
                 stream=True,
             ) as resp:
@@ -261,7 +445,7 @@ class OpenRouterProvider:
                         continue
 
                     try:
-                        data = json.loads(line)
+                        data = _loads(line)
                         for choice in data.get("choices", []):
                             delta = choice.get("delta") or choice.get("message") or {}
                             text = delta.get("content") or delta.get("text")
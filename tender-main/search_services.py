@@ -1,6 +1,9 @@
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
 
@@ -13,6 +16,37 @@ logger = logging.getLogger(__name__)
 # Максимально разумная цена за 1 единицу работы (руб.)
 # Всё, что выше, считаем неадекватным и игнорируем.
 MAX_REASONABLE_UNIT_PRICE = 10_000_000  # 10 млн руб.
+# Сколько пар (работа, город) держим в кэше цен
+PRICE_CACHE_MAXSIZE = 2048
+# Кэш исполнителей: размер и время жизни записи (сек.) — списки компаний
+# меняются чаще, чем цены, поэтому с TTL
+PERFORMERS_CACHE_MAXSIZE = 512
+PERFORMERS_CACHE_TTL = 3600.0
+
+_RE_CACHE_KEY_PUNCT = re.compile(r"[^\w\s]+")
+
+# Регулярки разбора запросов и ответов LLM — компилируются один раз при импорте
+_RE_SPACES = re.compile(r"\s+")
+_RE_EIS_OBJECT = re.compile(
+    r"(?:Объект закупки)\s+(.+?)\s+(?:Заказчик|Начальная цена|Размещено|Обновлено|Окончание подачи заявок|Этап закупки)",
+    re.IGNORECASE,
+)
+_RE_EIS_SITE = re.compile(r"Официальный сайт.*?закупок", re.IGNORECASE)
+_RE_THOUSANDS_K = re.compile(r"\bk\b")
+_RE_NUM_SPACES = re.compile(r"[\s\u00A0\u202F]+")
+_RE_NUM_JUNK = re.compile(r"[^\d.,\-]+")
+_RE_FENCE_OPEN = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_RE_FENCE_CLOSE = re.compile(r"```$")
+_RE_TRAIL_COMMA = re.compile(r",\s*([}\]])")
+_RE_PRICE_NUM = re.compile(r"\d[\d\s]{0,8}(?:[.,]\d+)?")
+
+
+def _normalize_cache_key(s: str) -> str:
+    """
+    Ключ кэша: нижний регистр, без пунктуации, пробелы схлопнуты.
+    "Свая винтовая, 76х2500." и "свая  винтовая 76х2500" дают один ключ.
+    """
+    return " ".join(_RE_CACHE_KEY_PUNCT.sub(" ", s.lower()).split())
 
 @dataclass
 class PriceInfo:
@@ -49,7 +83,9 @@ class SearchService:
     Сервис поиска цен.
 
     Реализация сейчас такая:
-    1) Кэш по (task, city), чтобы не дёргать LLM по кругу.
+    1) LRU-кэш удачных оценок по нормализованным (task, city), чтобы не дёргать LLM по кругу;
+       кэш потокобезопасный, один экземпляр можно делить между потоками.
+       Найденные исполнители кэшируются так же, но с TTL.
     2) Поиск цены через OpenRouter (LLM), аккуратный промпт,
        ответ строго в JSON, который парсим.
     3) Без лишних логов с кучей ссылок.
@@ -63,20 +99,16 @@ class SearchService:
         if not raw:
             return ""
 
-        q = re.sub(r"\s+", " ", str(raw)).strip()
+        q = _RE_SPACES.sub(" ", str(raw)).strip()
 
         # Если это типичный мусор с ЕИС, пробуем вытащить "Объект закупки ..."
         # Пример: "Объект закупки Поставка свай винтовых Заказчик ..."
-        m = re.search(
-            r"(?:Объект закупки)\s+(.+?)\s+(?:Заказчик|Начальная цена|Размещено|Обновлено|Окончание подачи заявок|Этап закупки)",
-            q,
-            flags=re.IGNORECASE,
-        )
+        m = _RE_EIS_OBJECT.search(q)
         if m:
             q = m.group(1).strip()
 
         # Убираем очевидные заголовки/шапки, если всё ещё похоже на ЕИС-описание сайта
-        q = re.sub(r"Официальный сайт.*?закупок", "", q, flags=re.IGNORECASE).strip()
+        q = _RE_EIS_SITE.sub("", q).strip()
 
         # Жёсткое ограничение длины (414 тебе уже намекнул)
         if len(q) > max_len:
@@ -85,7 +117,9 @@ class SearchService:
         return q
 
     def __init__(self) -> None:
-        self._cache: Dict[Tuple[str, str], PriceInfo] = {}
+        self._cache: "OrderedDict[Tuple[str, str], PriceInfo]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._performers_cache: "OrderedDict[Tuple[str, str, int], Tuple[list, float]]" = OrderedDict()
 
         # Инициализация провайдера
         self._provider = ProviderRegistry.get_provider()
@@ -368,12 +402,12 @@ class SearchService:
                 comment="Не задано описание вида работ для поиска цены.",
             )
 
-        cache_key = (task.lower(), city.lower())
-        if cache_key in self._cache:
+        cache_key = (_normalize_cache_key(task), _normalize_cache_key(city))
+        cached = self._cache_get(cache_key)
+        if cached is not None:
             logger.info(
                 "SearchService: используем кэш цен для '%s' (%s)", task, city
             )
-            cached = self._cache[cache_key]
             # Явно пометим, что это из кэша
             return PriceInfo(
                 ok=cached.ok,
@@ -392,13 +426,11 @@ class SearchService:
 
         # Если ключа нет — даже не пытаемся
         if not self._openrouter_api_key:
-            info = PriceInfo(
+            return PriceInfo(
                 ok=False,
                 source="none",
                 comment="OPENROUTER_API_KEY не настроен, поиск цен недоступен.",
             )
-            self._cache[cache_key] = info
-            return info
 
         try:
             raw_content = self._ask_llm_price(task, city)
@@ -411,9 +443,26 @@ class SearchService:
                 comment=f"Ошибка при запросе LLM: {e}",
             )
 
-        self._cache[cache_key] = info
+        # Неудачный результат не кэшируем: сервис общий на процесс, и разовая
+        # сетевая ошибка иначе «залипла» бы для этой позиции до перезапуска
+        if info.ok:
+            self._cache_put(cache_key, info)
         return info
 
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[PriceInfo]:
+        with self._cache_lock:
+            info = self._cache.get(key)
+            if info is not None:
+                self._cache.move_to_end(key)
+            return info
+
+    def _cache_put(self, key: Tuple[str, str], info: PriceInfo) -> None:
+        with self._cache_lock:
+            self._cache[key] = info
+            self._cache.move_to_end(key)
+            while len(self._cache) > PRICE_CACHE_MAXSIZE:
+                self._cache.popitem(last=False)
+
     # ------------------------------------------------------------------
     # Внутренний вызов OpenRouter
     # ------------------------------------------------------------------
@@ -495,6 +544,14 @@ class SearchService:
         if not task:
             return []
 
+        cache_key = (_normalize_cache_key(task), _normalize_cache_key(city), limit)
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._performers_cache.get(cache_key)
+            if cached is not None and now - cached[1] <= PERFORMERS_CACHE_TTL:
+                self._performers_cache.move_to_end(cache_key)
+                return list(cached[0])
+
         performers: list[PerformerInfo] = []
 
         # --- 1. Пытаемся через Яндекс, если ключ есть ---
@@ -517,6 +574,14 @@ class SearchService:
                 logger.exception("SearchService: ошибка при поиске исполнителей через Avito.")
                 performers = []
 
+        # Пустой результат не кэшируем: это может быть временная ошибка API
+        if performers:
+            with self._cache_lock:
+                self._performers_cache[cache_key] = (list(performers), now)
+                self._performers_cache.move_to_end(cache_key)
+                while len(self._performers_cache) > PERFORMERS_CACHE_MAXSIZE:
+                    self._performers_cache.popitem(last=False)
+
         return performers
 
     # ------------------------------------------------------------------
@@ -554,14 +619,14 @@ class SearchService:
             mult = 1.0
             if "млн" in s:
                 mult = 1_000_000.0
-            elif "тыс" in s or re.search(r"\bk\b", s):
+            elif "тыс" in s or _RE_THOUSANDS_K.search(s):
                 mult = 1_000.0
 
             # убрать все виды пробелов (включая NBSP/узкие)
-            s = re.sub(r"[\s\u00A0\u202F]+", "", s)
+            s = _RE_NUM_SPACES.sub("", s)
 
             # убрать валюты/буквы/прочий мусор, оставить цифры и разделители
-            s = re.sub(r"[^\d.,\-]+", "", s)
+            s = _RE_NUM_JUNK.sub("", s)
 
             # если внезапно диапазон "15000-20000" в одном поле — берём левую границу
             if "-" in s and not s.startswith("-"):
@@ -577,8 +642,8 @@ class SearchService:
                 return None
 
         # убираем ```json ... ``` оболочку, если есть
-        text = re.sub(r"^```(?:json)?\s*", "", text, flags=re.IGNORECASE)
-        text = re.sub(r"```$", "", text, flags=re.IGNORECASE).strip()
+        text = _RE_FENCE_OPEN.sub("", text)
+        text = _RE_FENCE_CLOSE.sub("", text).strip()
 
         # выдергиваем JSON-подобный фрагмент { ... }
         start = text.find("{")
@@ -602,7 +667,7 @@ class SearchService:
                 except Exception:
                     cleaned = s.strip()
                     # уберём запятые перед закрывающими скобками
-                    cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)
+                    cleaned = _RE_TRAIL_COMMA.sub(r"\1", cleaned)
                     # одинарные кавычки → двойные
                     cleaned = cleaned.replace("'", '"')
                     return json.loads(cleaned)
@@ -611,7 +676,7 @@ class SearchService:
             base = json_str.strip()
             if base:
                 variants.append(base)
-                variants.append(re.sub(r",\s*([}\]])", r"\1", base))
+                variants.append(_RE_TRAIL_COMMA.sub(r"\1", base))
                 variants.append(base.replace("'", '"'))
 
             obj = None
@@ -677,7 +742,7 @@ class SearchService:
 
         # ---------- 2. Эвристика, если JSON не дал диапазон ----------
         if not ok:
-            nums_raw = re.findall(r"\d[\d\s]{0,8}(?:[.,]\d+)?", text)
+            nums_raw = _RE_PRICE_NUM.findall(text)
             values = []
             for n in nums_raw:
                 v = _to_float(n)